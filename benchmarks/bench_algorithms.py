@@ -0,0 +1,71 @@
+"""
+Compares HS256 keyring and RS256 authorized keys verification.
+
+Full path of a request token, key lookup and claims decoding, with ``--keys``
+keys of each kind. RS256 token is signed with the last key, HS256 one is
+found by its ``kid``.
+
+    python -m benchmarks.bench_algorithms --keys 5 --number 500
+"""
+import argparse
+import secrets
+import timeit
+from datetime import datetime, timedelta
+
+import jwt
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+
+from flask_jwt_consumer.config import _Config
+from flask_jwt_consumer.flask_jwt_consumer import _set_defaults
+from flask_jwt_consumer.helpers import _decode_payload, _select_key
+
+
+def verify(token, cfg):
+    result = _select_key(token, cfg)
+    return _decode_payload(token, result.key, cfg, result.claims)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--keys', type=int, default=5,
+                        help='keys count of each kind')
+    parser.add_argument('--number', type=int, default=500,
+                        help='verifications per measurement')
+    parser.add_argument('--backend', default='pyjwt',
+                        help='JWT_VERIFIER_BACKEND for RS256')
+    args = parser.parse_args()
+
+    payload = {'sub': 'bench', 'exp': datetime.utcnow() + timedelta(days=1)}
+    private_keys = [rsa.generate_private_key(public_exponent=65537, key_size=2048)
+                    for _ in range(args.keys)]
+    hmac_keys = {'kid-{}'.format(i): secrets.token_hex(32) for i in range(args.keys)}
+    settings = {
+        'JWT_AUTHORIZED_KEYS': '\n'.join(
+            key.public_key().public_bytes(serialization.Encoding.OpenSSH,
+                                          serialization.PublicFormat.OpenSSH).decode('utf-8')
+            for key in private_keys),
+        'JWT_HMAC_KEYS': hmac_keys,
+        'JWT_VERIFIER_BACKEND': args.backend,
+    }
+    _set_defaults(settings)
+    cfg = _Config(settings)
+
+    last_kid = 'kid-{}'.format(args.keys - 1)
+    tokens = [
+        ('RS256', jwt.encode(payload, private_keys[-1], algorithm='RS256')),
+        ('HS256', jwt.encode(payload, hmac_keys[last_kid], algorithm='HS256',
+                             headers={'kid': last_kid})),
+    ]
+    print('{:<8} {:>12} {:>9}'.format('alg', 'us/token', 'speedup'))
+    baseline = None
+    for algorithm, token in tokens:
+        assert verify(token, cfg)['sub'] == 'bench'
+        timer = timeit.Timer(lambda: verify(token, cfg))
+        best = min(timer.repeat(repeat=5, number=args.number)) / args.number
+        baseline = baseline or best
+        print('{:<8} {:>12.1f} {:>8.1f}x'.format(algorithm, best * 1e6, baseline / best))
+
+
+if __name__ == '__main__':
+    main()
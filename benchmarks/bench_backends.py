@@ -0,0 +1,64 @@
+"""
+Compares verifier backends on the key lookup path.
+
+Every run puts the signing key last among ``--keys`` authorized keys, the way
+it is the worst for ``_brute_force_key``.
+
+    python -m benchmarks.bench_backends --keys 5 --number 200
+"""
+import argparse
+import timeit
+
+import jwt
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import ec, ed25519, rsa
+
+from flask_jwt_consumer import CryptographyBackend, PyJWTBackend
+from flask_jwt_consumer.helpers import _find_key
+from flask_jwt_consumer.tokens import parse_token
+
+GENERATORS = {
+    'RS256': lambda: rsa.generate_private_key(public_exponent=65537, key_size=2048),
+    'PS256': lambda: rsa.generate_private_key(public_exponent=65537, key_size=2048),
+    'ES256': lambda: ec.generate_private_key(ec.SECP256R1()),
+    'EdDSA': ed25519.Ed25519PrivateKey.generate,
+}
+
+
+def public_line(private_key):
+    return private_key.public_key().public_bytes(
+        serialization.Encoding.OpenSSH,
+        serialization.PublicFormat.OpenSSH).decode('utf-8')
+
+
+def find_key(backend, token, keys, algorithm):
+    return _find_key(parse_token(token), keys, algorithm, backend).key
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--keys', type=int, default=5,
+                        help='authorized keys count')
+    parser.add_argument('--number', type=int, default=200,
+                        help='lookups per measurement')
+    parser.add_argument('--algorithms', nargs='+', default=sorted(GENERATORS))
+    args = parser.parse_args()
+
+    backends = [('pyjwt', PyJWTBackend()), ('cryptography', CryptographyBackend())]
+    print('{:<8} {:<13} {:>12} {:>9}'.format('alg', 'backend', 'us/lookup', 'speedup'))
+    for algorithm in args.algorithms:
+        private_keys = [GENERATORS[algorithm]() for _ in range(args.keys)]
+        keys = [public_line(key) for key in private_keys]
+        token = jwt.encode({'sub': 'bench'}, private_keys[-1], algorithm=algorithm)
+        baseline = None
+        for name, backend in backends:
+            assert find_key(backend, token, keys, algorithm) == keys[-1]
+            timer = timeit.Timer(lambda: find_key(backend, token, keys, algorithm))
+            best = min(timer.repeat(repeat=5, number=args.number)) / args.number
+            baseline = baseline or best
+            print('{:<8} {:<13} {:>12.1f} {:>8.2f}x'.format(
+                algorithm, name, best * 1e6, baseline / best))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,249 @@
+"""
+Load test of a ``requires_jwt`` protected app on a local WSGI server.
+
+Starts sample flask app in N pre-forked worker processes, each running
+threaded werkzeug server on one shared socket, drives it with concurrent
+keep-alive clients for a while and reports throughput and tail latency for
+every workers and clients count, so it shows where scaling flattens out.
+
+    python -m benchmarks.load_test --workers 1 2 4 --clients 4 16 \\
+        --keys 5 --mix valid=70 expired=10 forged=10 last-key=10
+"""
+import argparse
+import http.client
+import multiprocessing
+import random
+import socket
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timedelta
+
+import jwt
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+
+MIXES = ('valid', 'expired', 'forged', 'last-key')
+
+
+def generate_keys(count):
+    private_keys = [rsa.generate_private_key(public_exponent=65537, key_size=2048)
+                    for _ in range(count)]
+    authorized = '\n'.join(
+        key.public_key().public_bytes(serialization.Encoding.OpenSSH,
+                                      serialization.PublicFormat.OpenSSH).decode('utf-8')
+        for key in private_keys)
+    return private_keys, authorized
+
+
+def make_tokens(private_keys):
+    """Tokens of every mix kind, valid ones are signed with the first key."""
+    later = datetime.utcnow() + timedelta(days=1)
+    earlier = datetime.utcnow() - timedelta(days=1)
+    stranger = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    return {
+        'valid': jwt.encode({'sub': 'load', 'exp': later}, private_keys[0], algorithm='RS256'),
+        'expired': jwt.encode({'sub': 'load', 'exp': earlier}, private_keys[0], algorithm='RS256'),
+        'forged': jwt.encode({'sub': 'load', 'exp': later}, stranger, algorithm='RS256'),
+        'last-key': jwt.encode({'sub': 'load', 'exp': later}, private_keys[-1], algorithm='RS256'),
+    }
+
+
+def make_app(authorized_keys, backend):
+    from flask import Flask
+
+    from flask_jwt_consumer import JWTConsumer, requires_jwt
+
+    app = Flask(__name__)
+    app.config['JWT_AUTHORIZED_KEYS'] = authorized_keys
+    app.config['JWT_VERIFIER_BACKEND'] = backend
+    app.config['JWT_REGISTER_ERROR_HANDLER'] = True
+    JWTConsumer(app)
+
+    @app.route('/protected')
+    @requires_jwt
+    def protected():
+        return 'ok'
+
+    return app
+
+
+def serve(fd, port, authorized_keys, backend):
+    """One worker, thread per connection, accepting on the inherited socket."""
+    import logging
+
+    from werkzeug.serving import make_server
+
+    logging.getLogger('werkzeug').setLevel(logging.ERROR)
+    app = make_app(authorized_keys, backend)
+    make_server('127.0.0.1', port, app, threaded=True, fd=fd).serve_forever()
+
+
+def listen():
+    sock = socket.socket()
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind(('127.0.0.1', 0))
+    sock.listen(128)
+    sock.set_inheritable(True)
+    return sock
+
+
+def wait_for(port, timeout=10):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            connection = http.client.HTTPConnection('127.0.0.1', port, timeout=1)
+            connection.request('GET', '/protected')
+            connection.getresponse().read()
+            connection.close()
+            return
+        except (OSError, http.client.HTTPException):
+            time.sleep(0.05)
+    raise RuntimeError('Server did not start on port {}'.format(port))
+
+
+def client_process(port, tokens, weights, threads, duration, results):
+    """Runs ``threads`` keep-alive clients, sends back latencies and statuses."""
+    latencies = []
+    statuses = Counter()
+    lock = threading.Lock()
+    stop_at = time.monotonic() + duration
+
+    def run():
+        rng = random.Random()
+        names = list(tokens)
+        own_latencies = []
+        own_statuses = Counter()
+        connection = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+        while time.monotonic() < stop_at:
+            name = rng.choices(names, weights)[0]
+            headers = {'Authorization': 'Bearer ' + tokens[name]}
+            started = time.perf_counter()
+            try:
+                connection.request('GET', '/protected', headers=headers)
+                response = connection.getresponse()
+                response.read()
+                status = response.status
+            except (OSError, http.client.HTTPException):
+                connection.close()
+                connection = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+                status = 'error'
+            own_latencies.append(time.perf_counter() - started)
+            own_statuses[status] += 1
+        connection.close()
+        with lock:
+            latencies.extend(own_latencies)
+            statuses.update(own_statuses)
+
+    workers = [threading.Thread(target=run) for _ in range(threads)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    results.put((latencies, statuses))
+
+
+def percentile(ordered, fraction):
+    if not ordered:
+        return float('nan')
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def run_setup(workers, clients, args, tokens, weights, authorized_keys):
+    context = multiprocessing.get_context('fork')
+    sock = listen()
+    port = sock.getsockname()[1]
+    servers = [context.Process(target=serve, daemon=True,
+                               args=(sock.fileno(), port, authorized_keys, args.backend))
+               for _ in range(workers)]
+    for server in servers:
+        server.start()
+    try:
+        wait_for(port)
+        results = context.Queue()
+        client_processes = min(args.client_processes, clients)
+        per_process = [clients // client_processes + (i < clients % client_processes)
+                       for i in range(client_processes)]
+        runners = [context.Process(
+            target=client_process,
+            args=(port, tokens, weights, threads, args.duration, results))
+            for threads in per_process]
+        for runner in runners:
+            runner.start()
+        latencies = []
+        statuses = Counter()
+        for _ in runners:
+            own_latencies, own_statuses = results.get()
+            latencies.extend(own_latencies)
+            statuses.update(own_statuses)
+        for runner in runners:
+            runner.join()
+    finally:
+        for server in servers:
+            server.terminate()
+            server.join()
+        sock.close()
+    latencies.sort()
+    return {
+        'requests': len(latencies),
+        'rps': len(latencies) / args.duration,
+        'p50': percentile(latencies, 0.50),
+        'p95': percentile(latencies, 0.95),
+        'p99': percentile(latencies, 0.99),
+        'statuses': statuses,
+    }
+
+
+def parse_mix(items):
+    mix = {}
+    for item in items:
+        name, _, weight = item.partition('=')
+        if name not in MIXES:
+            raise SystemExit('Unknown mix "{}", expected one of {}'.format(name, ', '.join(MIXES)))
+        mix[name] = float(weight or 1)
+    return mix
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4],
+                        help='server worker processes counts, one run each')
+    parser.add_argument('--clients', type=int, nargs='+', default=[8],
+                        help='concurrent clients counts, one run each')
+    parser.add_argument('--client-processes', type=int, default=2,
+                        help='processes to run clients in, not to be GIL bound')
+    parser.add_argument('--duration', type=float, default=5,
+                        help='seconds per run')
+    parser.add_argument('--keys', type=int, default=5,
+                        help='authorized keys count')
+    parser.add_argument('--backend', default='pyjwt',
+                        help='JWT_VERIFIER_BACKEND of the app')
+    parser.add_argument('--mix', nargs='+', default=['valid'],
+                        help='token kinds with weights, e.g. valid=70 forged=30')
+    args = parser.parse_args()
+
+    mix = parse_mix(args.mix)
+    private_keys, authorized_keys = generate_keys(args.keys)
+    all_tokens = make_tokens(private_keys)
+    tokens = {name: all_tokens[name] for name in mix}
+    weights = [mix[name] for name in tokens]
+
+    print('{:>7} {:>7} {:>9} {:>9} {:>8} {:>8} {:>8} {:>8}  {}'.format(
+        'workers', 'clients', 'requests', 'req/s', 'p50 ms', 'p95 ms', 'p99 ms',
+        'scaling', 'statuses'))
+    for clients in args.clients:
+        baseline = None
+        for workers in args.workers:
+            report = run_setup(workers, clients, args, tokens, weights, authorized_keys)
+            # Throughput per worker, against the first run of the same clients
+            per_worker = report['rps'] / workers
+            baseline = baseline or per_worker
+            statuses = ' '.join('{}:{}'.format(status, count)
+                                for status, count in sorted(report['statuses'].items(), key=str))
+            print('{:>7} {:>7} {:>9} {:>9.0f} {:>8.2f} {:>8.2f} {:>8.2f} {:>8.0%}  {}'.format(
+                workers, clients, report['requests'], report['rps'], report['p50'] * 1e3,
+                report['p95'] * 1e3, report['p99'] * 1e3, per_worker / baseline, statuses))
+
+
+if __name__ == '__main__':
+    main()
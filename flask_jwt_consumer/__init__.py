@@ -4,3 +4,11 @@ from .flask_jwt_consumer import JWTConsumer
 from .helpers import get_jwt_payload, get_jwt_raw
 from .decorators import requires_jwt
 from .errors import AuthError
+from .revocation import (BloomFilter, BloomRevocationStore,
+                         MemoryRevocationStore, RevocationStore)
+from .backends import CryptographyBackend, PyJWTBackend, VerifierBackend
+from .keyring import HMACKeyring
+from .middleware import JWTMiddleware
+from .tenants import selector_of
+from .introspection import Introspector
+from .ratelimit import MemoryRateLimitBackend, RateLimitBackend, RateLimiter
@@ -0,0 +1,239 @@
+""" Token signature verification backends."""
+from cryptography.exceptions import InvalidSignature, UnsupportedAlgorithm
+from cryptography.hazmat.primitives import hashes
+from cryptography.hazmat.primitives.asymmetric import ec, padding
+from cryptography.hazmat.primitives.asymmetric.ed448 import Ed448PublicKey
+from cryptography.hazmat.primitives.asymmetric.ed25519 import Ed25519PublicKey
+from cryptography.hazmat.primitives.asymmetric.rsa import RSAPublicKey
+from cryptography.hazmat.primitives.asymmetric.utils import \
+    encode_dss_signature
+from cryptography.hazmat.primitives.serialization import (load_pem_private_key,
+                                                          load_pem_public_key,
+                                                          load_ssh_public_key)
+
+import jwt
+from jwt.algorithms import get_default_algorithms
+
+from .stats import CacheInfo
+
+
+class VerifierBackend(object):
+    """
+    Interface for token signature verification.
+
+    Backends only answer whether or not token is signed with the key, claims
+    are validated afterwards, once the key is found. Misses are expected to be
+    the common case, so they are reported by return value, never raised.
+    """
+
+    def verify(self, token, key, algorithm):
+        """
+        Whether or not token is signed with the key using the algorithm.
+
+        :param token: ``tokens.Token``, already split and checked
+        :param key: public key, the way it comes from ``JWT_AUTHORIZED_KEYS``
+        :param algorithm: the only algorithm token is allowed to use
+        """
+        raise NotImplementedError
+
+
+_decode_options = {
+    'verify_signature': True,
+    'verify_exp': False,
+    'verify_nbf': False,
+    'verify_iat': False,
+    'verify_aud': False,
+    'verify_iss': False,
+    'require_exp': False,
+    'require_iat': False,
+    'require_nbf': False
+}
+
+
+def _decode_verify(token, key, algorithm):
+    """Full ``jwt.decode``, for the rare tokens with exotic headers."""
+    try:
+        jwt.decode(token.raw, key, algorithms=[algorithm], options=_decode_options)
+    except (jwt.PyJWTError, ValueError, TypeError):
+        return False
+    return True
+
+
+class PyJWTBackend(VerifierBackend):
+    """Verifies with PyJWT algorithms, keys are prepared once per algorithm."""
+
+    _max_keys = 256
+
+    def __init__(self):
+        self._algorithms = get_default_algorithms()
+        self._keys = {}
+        self.hits = self.misses = 0
+
+    def cache_info(self):
+        return CacheInfo(self.hits, self.misses, self._max_keys, len(self._keys))
+
+    def _prepare_key(self, key, algorithm):
+        try:
+            prepared = self._keys[key, algorithm]
+            self.hits += 1
+            return prepared
+        except KeyError:
+            self.misses += 1
+        try:
+            prepared = self._algorithms[algorithm].prepare_key(key)
+        except (jwt.PyJWTError, ValueError, TypeError, UnsupportedAlgorithm):
+            prepared = None
+        if len(self._keys) >= self._max_keys:
+            self._keys.clear()
+        self._keys[key, algorithm] = prepared
+        return prepared
+
+    def verify(self, token, key, algorithm):
+        if algorithm not in self._algorithms:
+            return False
+        if token.exotic:
+            return _decode_verify(token, key, algorithm)
+        prepared = self._prepare_key(key, algorithm)
+        if prepared is None:
+            return False
+        return self._algorithms[algorithm].verify(
+            token.signing_input, prepared, token.signature)
+
+
+def _rsa_pkcs1(hash_alg):
+    def verify(key, signing_input, signature):
+        if not isinstance(key, RSAPublicKey):
+            return False
+        key.verify(signature, signing_input, padding.PKCS1v15(), hash_alg())
+        return True
+    return verify
+
+
+def _rsa_pss(hash_alg):
+    pss = padding.PSS(mgf=padding.MGF1(hash_alg()),
+                      salt_length=hash_alg.digest_size)
+
+    def verify(key, signing_input, signature):
+        if not isinstance(key, RSAPublicKey):
+            return False
+        key.verify(signature, signing_input, pss, hash_alg())
+        return True
+    return verify
+
+
+def _ecdsa(hash_alg, curve):
+    size = (curve.key_size + 7) // 8
+    algorithm = ec.ECDSA(hash_alg())
+
+    def verify(key, signing_input, signature):
+        if not isinstance(key, ec.EllipticCurvePublicKey) \
+                or not isinstance(key.curve, curve) \
+                or len(signature) != 2 * size:
+            return False
+        r = int.from_bytes(signature[:size], 'big')
+        s = int.from_bytes(signature[size:], 'big')
+        key.verify(encode_dss_signature(r, s), signing_input, algorithm)
+        return True
+    return verify
+
+
+def _eddsa(key, signing_input, signature):
+    if not isinstance(key, (Ed25519PublicKey, Ed448PublicKey)):
+        return False
+    key.verify(signature, signing_input)
+    return True
+
+
+class CryptographyBackend(VerifierBackend):
+    """
+    Verifies with ``cryptography`` primitives directly.
+
+    Keys are loaded once and kept around, there is no algorithm dispatch and
+    no key re-validation on the way. Tokens with less common headers
+    (``crit``, ``b64``) and algorithms it does not know are passed to
+    ``fallback``, to keep results exactly the same as PyJWT ones.
+    """
+
+    _verifiers = {
+        'RS256': _rsa_pkcs1(hashes.SHA256),
+        'RS384': _rsa_pkcs1(hashes.SHA384),
+        'RS512': _rsa_pkcs1(hashes.SHA512),
+        'PS256': _rsa_pss(hashes.SHA256),
+        'PS384': _rsa_pss(hashes.SHA384),
+        'PS512': _rsa_pss(hashes.SHA512),
+        'ES256': _ecdsa(hashes.SHA256, ec.SECP256R1),
+        'ES256K': _ecdsa(hashes.SHA256, ec.SECP256K1),
+        'ES384': _ecdsa(hashes.SHA384, ec.SECP384R1),
+        'ES512': _ecdsa(hashes.SHA512, ec.SECP521R1),
+        'EdDSA': _eddsa,
+    }
+
+    _max_keys = 256
+
+    def __init__(self, fallback=None):
+        self.fallback = fallback if fallback is not None else PyJWTBackend()
+        self._keys = {}
+        self.hits = self.misses = 0
+
+    def cache_info(self):
+        return CacheInfo(self.hits, self.misses, self._max_keys, len(self._keys))
+
+    def load_key(self, key):
+        """Public key object for the raw key, ``None`` if it is not usable."""
+        try:
+            loaded = self._keys[key]
+            self.hits += 1
+            return loaded
+        except KeyError:
+            self.misses += 1
+        raw = key.encode('utf-8') if isinstance(key, str) else key
+        try:
+            if raw.startswith((b'ssh-', b'ecdsa-sha2-')):
+                loaded = load_ssh_public_key(raw)
+            elif b'PRIVATE KEY-----' in raw:
+                loaded = load_pem_private_key(raw, password=None).public_key()
+            else:
+                loaded = load_pem_public_key(raw)
+        except (ValueError, TypeError, UnsupportedAlgorithm):
+            loaded = None
+        if len(self._keys) >= self._max_keys:
+            self._keys.clear()
+        self._keys[key] = loaded
+        return loaded
+
+    def verify(self, token, key, algorithm):
+        verifier = self._verifiers.get(algorithm)
+        if verifier is None or token.exotic:
+            return self.fallback.verify(token, key, algorithm)
+        public_key = self.load_key(key)
+        if public_key is None:
+            return False
+        try:
+            return verifier(public_key, token.signing_input, token.signature)
+        except InvalidSignature:
+            return False
+
+
+_BACKENDS = {
+    'pyjwt': PyJWTBackend,
+    'cryptography': CryptographyBackend,
+}
+
+_instances = {}
+
+
+def create_backend(name):
+    """New backend instance, by its name."""
+    if name not in _BACKENDS:
+        raise RuntimeError('Unknown JWT_VERIFIER_BACKEND "{}", expected one '
+                           'of {}'.format(name, ', '.join(sorted(_BACKENDS))))
+    return _BACKENDS[name]()
+
+
+def get_backend(name):
+    """Shared backend instance, by its name."""
+    try:
+        return _instances[name]
+    except KeyError:
+        pass
+    return _instances.setdefault(name, create_backend(name))
@@ -0,0 +1,190 @@
+""" Command line bulk token verification, for logs and incident response."""
+import argparse
+import itertools
+import json
+import multiprocessing
+import sys
+
+import jwt
+
+from . import errors
+from .config import _Config
+from .errors import AuthError
+from .flask_jwt_consumer import _set_defaults
+from .helpers import (MALFORMED, MATCH, _check_token_size, _decode_payload,
+                      _select_key)
+from .keyring import HMACKey
+
+# Per worker process state, set up once by _init_worker
+_worker = {}
+
+
+def _init_worker(settings, labels):
+    _worker['config'] = _Config(settings)
+    _worker['labels'] = labels
+
+
+def _key_label(key):
+    if isinstance(key, HMACKey):
+        return {'kid': key.kid}
+    key = key.encode('utf-8') if isinstance(key, str) else key
+    key_set, index = _worker['labels'][key]
+    return {'set': key_set, 'index': index}
+
+
+def _verify_line(item):
+    """Verifies one token, result is a JSON serializable dict."""
+    source, number, token = item
+    cfg = _worker['config']
+    record = {'source': source, 'line': number}
+    try:
+        _check_token_size(token, cfg=cfg)
+        try:
+            result = _select_key(token, cfg)
+        except RuntimeError:
+            if _worker['labels']:
+                raise
+            # Only HMAC keyring is given, there is nothing to try the rest with
+            raise AuthError(errors.NO_KEY, 401)
+        if result.status == MALFORMED:
+            raise AuthError(errors.INVALID_TOKEN, 401)
+        if result.status != MATCH:
+            raise AuthError(errors.NO_KEY, 401)
+        # Key is known even when claims turn out to be no good, e.g. expired
+        record['key'] = _key_label(result.key)
+        try:
+            record['claims'] = _decode_payload(token, result.key, cfg, result.claims)
+        except AuthError:
+            # Signature is good, so claims of e.g. expired token are still shown
+            try:
+                record['claims'] = jwt.decode(token, options={'verify_signature': False})
+            except jwt.PyJWTError:
+                pass
+            raise
+    except AuthError as error:
+        record['error'] = error.content['code']
+        record['description'] = error.content['description']
+    return record
+
+
+def _read_keys(paths):
+    """Authorized keys of all the sets, with set name and index of every key."""
+    lines = []
+    labels = {}
+    for path in paths:
+        with open(path, 'r') as stream:
+            for index, line in enumerate(stream.read().splitlines()):
+                line = line.strip()
+                if not line or line.startswith('#'):
+                    continue
+                labels.setdefault(line.encode('utf-8'), (path, index))
+                lines.append(line)
+    return '\n'.join(lines), labels
+
+
+def _tokens(paths, stdin):
+    """Streams ``(source, line number, token)``, blank lines are skipped."""
+    for path in paths or ['-']:
+        stream = stdin if path == '-' else open(path, 'r')
+        try:
+            for number, line in enumerate(stream, 1):
+                token = line.strip()
+                if token:
+                    yield path, number, token
+        finally:
+            if stream is not stdin:
+                stream.close()
+
+
+def _batches(items, size):
+    items = iter(items)
+    while True:
+        batch = list(itertools.islice(items, size))
+        if not batch:
+            return
+        yield batch
+
+
+def verify(args, stdin=None, stdout=None):
+    """Verifies every token, writes JSON line per token, returns invalid count."""
+    stdin = stdin or sys.stdin
+    stdout = stdout or sys.stdout
+    authorized_keys, labels = _read_keys(args.keys)
+    settings = {
+        'JWT_AUTHORIZED_KEYS': authorized_keys or None,
+        'JWT_HMAC_KEYS_FILE': args.hmac_keys,
+        'JWT_ALGORITHM': args.algorithm,
+        'JWT_IDENTITY': args.audience,
+        'VERIFY_AUD': not args.no_verify_aud,
+        'JWT_VERIFIER_BACKEND': args.backend,
+        'JWT_MAX_TOKEN_LENGTH': args.max_token_length,
+    }
+    _set_defaults(settings)
+    # Bad options fail here, not in every worker
+    _Config(settings).verifier
+    _Config(settings).hmac_keyring
+
+    invalid = [0]
+
+    def write(records):
+        for record in records:
+            invalid[0] += 'error' in record
+            stdout.write(json.dumps(record, default=str, separators=(',', ':')))
+            stdout.write('\n')
+
+    batches = _batches(_tokens(args.files, stdin), args.batch_size)
+    if args.workers <= 1:
+        _init_worker(settings, labels)
+        for batch in batches:
+            write(map(_verify_line, batch))
+        return invalid[0]
+
+    chunksize = max(1, args.batch_size // (args.workers * 4))
+    with multiprocessing.Pool(args.workers, _init_worker, (settings, labels)) as pool:
+        # Next batch is verified while the previous one is written out, so
+        # there are never more than two batches in memory
+        pending = None
+        for batch in batches:
+            submitted = pool.map_async(_verify_line, batch, chunksize)
+            if pending is not None:
+                write(pending.get())
+            pending = submitted
+        if pending is not None:
+            write(pending.get())
+    return invalid[0]
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        prog='python -m flask_jwt_consumer',
+        description='Flask JWT consumer tools.')
+    commands = parser.add_subparsers(dest='command')
+    commands.required = True
+
+    command = commands.add_parser(
+        'verify', help='verify tokens, one per line, and write JSON line results')
+    command.add_argument('files', nargs='*',
+                         help='files with tokens, stdin when none or "-"')
+    command.add_argument('--keys', action='append', default=[],
+                         help='authorized keys file, repeat for historical sets')
+    command.add_argument('--hmac-keys',
+                         help='file with "kid secret" lines')
+    command.add_argument('--algorithm', default='RS256')
+    command.add_argument('--audience', help='expected aud claim')
+    command.add_argument('--no-verify-aud', action='store_true')
+    command.add_argument('--backend', default='cryptography',
+                         help='verifier backend, pyjwt or cryptography')
+    command.add_argument('--max-token-length', type=int, default=8192)
+    command.add_argument('--workers', type=int, default=multiprocessing.cpu_count(),
+                         help='worker processes, 1 to verify in process')
+    command.add_argument('--batch-size', type=int, default=10000,
+                         help='tokens read ahead at most')
+    return parser
+
+
+def main(argv=None, stdin=None, stdout=None):
+    args = build_parser().parse_args(argv)
+    if not args.keys and not args.hmac_keys:
+        raise SystemExit('At least one of --keys or --hmac-keys is expected')
+    invalid = verify(args, stdin, stdout)
+    return 1 if invalid else 0
@@ -1,5 +1,16 @@
 from flask import current_app
 
+from .backends import get_backend
+from .introspection import Introspector
+from .keyring import HMACKeyring
+from .ratelimit import MemoryRateLimitBackend, RateLimiter
+from .stats import Stats
+
+
+# Where objects built out of ``app.config`` are kept, per app
+BUILT_KEY = 'flask-jwt-built'
+
+
 class _Config(object):
     """
     Helper object for accessing and verifying options in this extension.
@@ -8,28 +19,55 @@ class _Config(object):
     should be done with flasks ```app.config```.
     Default values for the configuration options are set in the jwt_manager
     object. All of these values are read only.
+
+    Outside of flask, e.g. in WSGI middleware, settings mapping is given
+    explicitly and used instead of ``current_app.config``.
     """
 
+    def __init__(self, settings=None):
+        self._source = settings
+        self._own_built = {}
+        self.stats = Stats()
+
+    @property
+    def _settings(self):
+        if self._source is not None:
+            return self._source
+        return current_app.config
+
+    def _settings_and_built(self):
+        """
+        Settings with the objects built out of them, keyring, limiter and such.
+
+        Built objects of ``current_app.config`` are kept in ``app.extensions``,
+        so apps of one process with different settings keep their own, e.g.
+        rate limit buckets, not rebuilt whenever the other app is called.
+        """
+        if self._source is not None:
+            return self._source, self._own_built
+        app = current_app._get_current_object()
+        return app.config, app.extensions.setdefault(BUILT_KEY, {})
+
     @property
     def decode_keys(self):
         return self._public_keys
 
     @property
     def header_name(self):
-        name = current_app.config['JWT_HEADER_NAME']
-        use_cookie = current_app.config['JWT_USE_COOKIE']
+        name = self._settings['JWT_HEADER_NAME']
+        use_cookie = self._settings['JWT_USE_COOKIE']
         if not name and not use_cookie:
             raise RuntimeError('JWT_HEADER_NAME cannot be empty')
         return name
 
     @property
     def use_cookie(self):
-        return current_app.config['JWT_USE_COOKIE']
+        return self._settings['JWT_USE_COOKIE']
     
     @property
     def cookie_name(self):
-        use_cookie = current_app.config['JWT_USE_COOKIE']
-        cookie_name = current_app.config['JWT_COOKIE_NAME']
+        use_cookie = self._settings['JWT_USE_COOKIE']
+        cookie_name = self._settings['JWT_COOKIE_NAME']
         if use_cookie and not cookie_name:
             raise RuntimeError(
                 'JWT_COOKIE_NAME cannot be empty when JWT_USE_COOKIE is enabled'
@@ -38,28 +76,120 @@ class _Config(object):
 
     @property
     def header_type(self):
-        return current_app.config['JWT_HEADER_TYPE']
+        return self._settings['JWT_HEADER_TYPE']
+
+    @property
+    def max_token_length(self):
+        return self._settings['JWT_MAX_TOKEN_LENGTH']
+
+    @property
+    def max_token_segments(self):
+        return self._settings['JWT_MAX_TOKEN_SEGMENTS']
 
     @property
     def algorithm(self):
-        return current_app.config['JWT_ALGORITHM']
+        return self._settings['JWT_ALGORITHM']
 
     @property
     def audience(self):
-        return current_app.config['JWT_IDENTITY']
+        return self._settings['JWT_IDENTITY']
 
     @property
     def verify_aud(self):
-        return current_app.config['VERIFY_AUD']
+        return self._settings['VERIFY_AUD']
+
+    @property
+    def verifier(self):
+        backend = self._settings['JWT_VERIFIER_BACKEND']
+        if isinstance(backend, str):
+            return get_backend(backend)
+        return backend
+
+    @property
+    def revocation_store(self):
+        return self._settings['JWT_REVOCATION_STORE']
+
+    @property
+    def hmac_algorithms(self):
+        return self._settings['JWT_HMAC_ALGORITHMS']
+
+    @property
+    def hmac_keyring(self):
+        """Keyring is built once, and again only when its settings change."""
+        settings, built = self._settings_and_built()
+        keys = settings['JWT_HMAC_KEYS']
+        path = settings['JWT_HMAC_KEYS_FILE']
+        algorithms = tuple(settings['JWT_HMAC_ALGORITHMS'])
+        # Keys are told apart by identity, not to compare every secret per
+        # request, so changed secrets have to be set as a new mapping
+        cached_keys, cached_rest, keyring = built.get('keyring', (None, None, None))
+        if keys is cached_keys and (path, algorithms) == cached_rest:
+            return keyring
+        source = keys
+        if isinstance(keys, str):
+            keys = HMACKeyring.parse(keys)
+        secrets = dict(keys or {})
+        if path:
+            with open(path, 'r') as stream:
+                secrets.update(HMACKeyring.parse(stream.read()))
+        keyring = HMACKeyring(secrets, algorithms) if secrets else None
+        built['keyring'] = (source, (path, algorithms), keyring)
+        return keyring
+
+    @property
+    def introspector(self):
+        """Introspection client, built once and kept with its pool and cache."""
+        settings, built = self._settings_and_built()
+        url = settings['JWT_INTROSPECTION_URL']
+        if not url:
+            return None
+        auth = settings['JWT_INTROSPECTION_AUTH']
+        source = (url, tuple(auth) if auth else None,
+                  settings['JWT_INTROSPECTION_TIMEOUT'],
+                  settings['JWT_INTROSPECTION_CACHE_SIZE'])
+        cached_source, introspector = built.get('introspector', (None, None))
+        if source == cached_source:
+            return introspector
+        introspector = Introspector(*source)
+        built['introspector'] = (source, introspector)
+        return introspector
+
+    @property
+    def rate_limiter(self):
+        """Rate limiter, built once and kept with its buckets."""
+        settings, built = self._settings_and_built()
+        claim = settings['JWT_RATE_LIMIT_CLAIM']
+        if not claim:
+            return None
+        source = (claim, settings['JWT_RATE_LIMIT_RATE'],
+                  settings['JWT_RATE_LIMIT_BURST'],
+                  settings['JWT_RATE_LIMIT_BACKEND'],
+                  settings['JWT_RATE_LIMIT_TABLE_SIZE'])
+        cached_source, limiter = built.get('rate_limiter', (None, None))
+        if source == cached_source:
+            return limiter
+        backend = source[3]
+        if backend is None:
+            backend = MemoryRateLimitBackend(source[4])
+        limiter = RateLimiter(claim, source[1], source[2], backend)
+        built['rate_limiter'] = (source, limiter)
+        return limiter
 
     @property
     def _public_keys(self):
-        keys = current_app.config['JWT_AUTHORIZED_KEYS']
+        settings, built = self._settings_and_built()
+        keys = settings['JWT_AUTHORIZED_KEYS']
         if not keys:
             raise RuntimeError('JWT_AUTHORIZED_KEYS must be set to use '
                                'asymmetric cryptography algorithm '
                                '"{}"'.format(self.algorithm))
-        return bytes(keys, 'utf-8').splitlines()
+        # Parsed once, and again only when the option is set to another value
+        cached_source, parsed = built.get('keys', (None, None))
+        if keys is cached_source:
+            return parsed
+        parsed = bytes(keys, 'utf-8').splitlines()
+        built['keys'] = (keys, parsed)
+        return parsed
 
 
 config = _Config()
@@ -1,8 +1,127 @@
+import json
+
+from flask import current_app, request
+
+from .tenants import tenant_of
+
+# Common errors, their responses are rendered once and reused
+AUTHORIZATION_HEADER_MISSING = {'code': 'authorization_header_missing',
+                                'description': 'Authorization header is expected.'}
+AUTHORIZATION_COOKIE_MISSING = {'code': 'authorization_cookie_missing',
+                                'description': 'Authorization cookie is expected.'}
+TOKEN_NOT_FOUND = {'code': 'invalid_header',
+                   'description': 'Token not found.'}
+TOKEN_TOO_LONG = {'code': 'invalid_header',
+                  'description': 'Token is too long.'}
+TOKEN_TOO_MANY_SEGMENTS = {'code': 'invalid_header',
+                           'description': 'Token has too many segments.'}
+TOKEN_EXPIRED = {'code': 'token_expired',
+                 'description': 'Token is expired.'}
+TOKEN_REVOKED = {'code': 'token_revoked',
+                 'description': 'Token has been revoked.'}
+INVALID_CLAIMS = {'code': 'invalid_claims',
+                  'description': 'Incorrect claims, please check the issued at, audience or issuer.'}
+MISSING_CLAIMS = {'code': 'invalid_claims',
+                  'description': 'Missing claims, please check the audience.'}
+INVALID_TOKEN = {'code': 'invalid_header',
+                 'description': 'Unable to parse authentication token.'}
+NO_KEY = {'code': 'Invalid_header.',
+          'description': 'Unable to find appropriate key.'}
+TOKEN_INACTIVE = {'code': 'token_inactive',
+                  'description': 'Token is not active.'}
+INSUFFICIENT_SCOPE = {'code': 'insufficient_scope',
+                      'description': 'Token does not have the scope required.'}
+RATE_LIMITED = {'code': 'rate_limited',
+                'description': 'Too many requests, please retry later.'}
+INTROSPECTION_UNAVAILABLE = {'code': 'introspection_unavailable',
+                             'description': 'Unable to introspect token.'}
+
+# Per RFC 6750 there is no error code when credentials are not there at all
+_NO_CREDENTIALS = frozenset(['authorization_header_missing',
+                             'authorization_cookie_missing'])
+
+_rendered = {}
+_MAX_RENDERED = 256
+
+
 # Error handler
 class AuthError(Exception):
     """Throws exeptions period."""
 
-    def __init__(self, error, status_code):
-        """Initializer period."""
+    def __init__(self, error, status_code, headers=None):
+        """
+        Initializer period.
+
+        :param error: dict with ``code`` and ``description``
+        :param status_code: HTTP status code
+        :param headers: extra response headers, e.g. ``Retry-After``
+        """
         self.content = error
         self.code = status_code
+        self.headers = headers
+
+    def render(self, scheme='Bearer'):
+        """Response body bytes and headers, shared between equal errors."""
+        content = self.content
+        try:
+            cache_key = (scheme, self.code, content['code'], content['description'])
+            rendered = _rendered.get(cache_key)
+        except (KeyError, TypeError):
+            cache_key = rendered = None
+        if rendered is None:
+            rendered = _render(content, self.code, scheme)
+            if cache_key is not None and len(_rendered) < _MAX_RENDERED:
+                _rendered[cache_key] = rendered
+        body, headers = rendered
+        if self.headers:
+            headers = headers + tuple(self.headers.items())
+        return body, headers
+
+    @property
+    def body(self):
+        return self.render()[0]
+
+
+def _quote(value):
+    return '"{}"'.format(str(value).replace('\\', '\\\\').replace('"', '\\"'))
+
+
+def _render(content, status_code, scheme):
+    body = json.dumps(content, separators=(',', ':')).encode('utf-8')
+    headers = ()
+    code = content.get('code') if isinstance(content, dict) else None
+    if status_code == 401:
+        error = None if code in _NO_CREDENTIALS else 'invalid_token'
+    elif status_code == 403 and code == INSUFFICIENT_SCOPE['code']:
+        error = code
+    else:
+        return body, headers
+    challenge = scheme or 'Bearer'
+    if error is not None:
+        challenge += ' error="{}"'.format(error)
+        if isinstance(content, dict) and 'description' in content:
+            challenge += ', error_description=' + _quote(content['description'])
+    headers = (('WWW-Authenticate', challenge),)
+    return body, headers
+
+
+def handle_auth_error(error):
+    """Flask error handler, registered when ``JWT_REGISTER_ERROR_HANDLER`` is on."""
+    consumer = tenant_of(current_app, request)
+    if consumer is not None:
+        scheme = consumer.config.header_type
+    else:
+        scheme = current_app.config['JWT_HEADER_TYPE']
+    body, headers = error.render(scheme)
+    return current_app.response_class(body, status=error.code, headers=headers,
+                                      mimetype='application/json')
+
+
+for _content in (AUTHORIZATION_HEADER_MISSING, AUTHORIZATION_COOKIE_MISSING,
+                 TOKEN_NOT_FOUND, TOKEN_TOO_LONG, TOKEN_TOO_MANY_SEGMENTS,
+                 TOKEN_EXPIRED, TOKEN_REVOKED, INVALID_CLAIMS, MISSING_CLAIMS,
+                 INVALID_TOKEN, NO_KEY, TOKEN_INACTIVE):
+    AuthError(_content, 401).render()
+AuthError(INTROSPECTION_UNAVAILABLE, 503).render()
+AuthError(RATE_LIMITED, 429).render()
+AuthError(INSUFFICIENT_SCOPE, 403).render()
@@ -2,6 +2,15 @@
 """ Ensures JWT secure communication."""
 # Shamelessly (mostly) stolen from https://auth0.com/docs/quickstart/backend/python
 # Inspired by https://github.com/vimalloc/flask-jwt-simple.
+from flask import abort, current_app, jsonify, request
+
+from . import errors
+from .backends import create_backend
+from .config import _Config, config
+from .decorators import requires_jwt
+from .errors import AuthError, handle_auth_error
+from .helpers import get_jwt_payload
+from .tenants import selector_of, tenant_of
 
 
 # Main JWT manager object
@@ -12,9 +21,18 @@ class JWTConsumer(object):
     Instances :class:`JWTManager` are *not* bound to specific apps, so
     you can create one in the main body of your code and then bind it
     to your app in a factory function.
+
+    Named instances serve tenants of one app, each with its own keys, claim
+    policy and caches, picked per request by host or path prefix::
+
+        JWTConsumer(app, name='acme', hosts=['acme.example.com'],
+                    settings={'JWT_AUTHORIZED_KEYS': acme_keys,
+                              'JWT_IDENTITY': 'acme-api'})
+
+    Requests no tenant claims are verified with ``app.config`` as usual.
     """
 
-    def __init__(self, app=None):
+    def __init__(self, app=None, name=None, settings=None, hosts=(), path_prefixes=()):
         """
         Create the JWTManager instance.
 
@@ -22,7 +40,20 @@ class JWTConsumer(object):
         in directly here to register this extension with the flask app, or
         call init_app after creating this object
         :param app: A flask application
+        :param name: tenant name, the instance reads ``app.config`` when not given
+        :param settings: tenant options, override the ones of ``app.config``
+        :param hosts: hosts of the tenant requests
+        :param path_prefixes: path prefixes of the tenant requests, e.g. ``/acme``
         """
+        self.name = name
+        self.settings = dict(settings or {})
+        self.hosts = tuple(hosts)
+        self.path_prefixes = tuple(path_prefixes)
+        self.config = config
+        self._stats_endpoint = None
+        if name is None and (self.settings or self.hosts or self.path_prefixes):
+            raise RuntimeError('JWTConsumer settings, hosts and path prefixes '
+                               'are only for named instances')
         # Register this extension with the flask app now (if it is provided)
         if app is not None:
             self.init_app(app)
@@ -36,27 +67,135 @@ class JWTConsumer(object):
         # Save this so we can use it later in the extension
         if not hasattr(app, 'extensions'):   # pragma: no cover
             app.extensions = {}
-        app.extensions['flask-jwt-management'] = self
         self._set_default_configuration_options(app)
+        if self.name is None:
+            app.extensions['flask-jwt-management'] = self
+            settings = app.config
+        else:
+            settings = self._tenant_settings(app)
+            self.config = _Config(settings)
+            selector_of(app).add(self, self.hosts, self.path_prefixes)
+        if settings['JWT_REGISTER_ERROR_HANDLER']:
+            app.register_error_handler(AuthError, handle_auth_error)
+        if self.name is None and settings['JWT_STATS_ENDPOINT']:
+            self._stats_endpoint = settings['JWT_STATS_ENDPOINT']
+            app.add_url_rule(self._stats_endpoint,
+                             'flask_jwt_consumer_stats',
+                             requires_jwt(self._stats_view))
+        elif self.name is not None and self.settings.get('JWT_STATS_ENDPOINT'):
+            self._stats_endpoint = settings['JWT_STATS_ENDPOINT']
+            app.add_url_rule(self._stats_endpoint,
+                             'flask_jwt_consumer_stats_' + self.name,
+                             requires_jwt(self._stats_view))
+
+    def _tenant_settings(self, app):
+        """App options overridden by the tenant ones, taken once at init_app."""
+        settings = {key: value for key, value in app.config.items()
+                    if key.startswith('JWT_') or key == 'VERIFY_AUD'}
+        settings.update(self.settings)
+        _set_defaults(settings)
+        # Own verifier instance, so keys of a big tenant do not push the
+        # others out of its loaded keys cache
+        if isinstance(settings['JWT_VERIFIER_BACKEND'], str):
+            settings['JWT_VERIFIER_BACKEND'] = create_backend(settings['JWT_VERIFIER_BACKEND'])
+        return settings
+
+    def snapshot(self):
+        """
+        Verification stats of this process.
+
+        Named consumers keep their own, the default one shares its counters
+        with every app of the process verified with ``app.config``.
+
+        Matches per authorized key, average keys tried per lookup, failures
+        by ``AuthError`` code and sizes and hit rates of the caches.
+        """
+        return self.config.stats.snapshot(self.config)
+
+    def _stats_view(self):
+        # Every consumer with the same path lands on the rule registered first,
+        # the stats served are of the one the token was verified for
+        consumer = tenant_of(current_app, request)
+        if consumer is None:
+            consumer = current_app.extensions.get('flask-jwt-management')
+        if consumer is None or consumer._stats_endpoint != request.url_rule.rule:
+            abort(404)
+        scope = consumer.config._settings['JWT_STATS_SCOPE']
+        if scope:
+            granted = get_jwt_payload().get('scope')
+            if not isinstance(granted, str) or scope not in granted.split():
+                raise AuthError(errors.INSUFFICIENT_SCOPE, 403)
+        return jsonify(consumer.snapshot())
 
     @staticmethod
     def _set_default_configuration_options(app):
         """Sets the default configuration options used by this extension."""
-        # Options for JWTs when the TOKEN_LOCATION is headers
-        app.config.setdefault('JWT_USE_COOKIE', False)
-        app.config.setdefault('JWT_HEADER_NAME', 'Authorization')
-        app.config.setdefault('JWT_HEADER_TYPE', 'Bearer')
+        _set_defaults(app.config)
+
+
+def _set_defaults(settings):
+    """Sets the default configuration options on any settings mapping."""
+    # Options for JWTs when the TOKEN_LOCATION is headers
+    settings.setdefault('JWT_USE_COOKIE', False)
+    settings.setdefault('JWT_HEADER_NAME', 'Authorization')
+    settings.setdefault('JWT_HEADER_TYPE', 'Bearer')
+
+    # Anything bigger is rejected before decoding, ``None`` to disable
+    settings.setdefault('JWT_MAX_TOKEN_LENGTH', 8192)
+    settings.setdefault('JWT_MAX_TOKEN_SEGMENTS', 3)
+
+    # What algorithm to use to sign the token. See here for a list of options:
+    # https://github.com/jpadilla/pyjwt/blob/master/jwt/api_jwt.py
+    settings.setdefault('JWT_ALGORITHM', 'RS256')
+
+    # Expected value of the audience claim
+    settings.setdefault('JWT_IDENTITY', None)
+
+    # Whether or not to disable audience verification
+    settings.setdefault('VERIFY_AUD', True)
+
+    # Key to verify JWTs with when use when using an asymmetric
+    # (public/private key) algorithms, such as RS* or EC*
+    settings.setdefault('JWT_AUTHORIZED_KEYS', None)
+
+    # Symmetric secrets, kept apart from the keys above. Mapping of kid to
+    # secret, or ``kid secret`` lines, and/or the file with such lines
+    settings.setdefault('JWT_HMAC_KEYS', None)
+    settings.setdefault('JWT_HMAC_KEYS_FILE', None)
+
+    # The only algorithms HMAC secrets are used with
+    settings.setdefault('JWT_HMAC_ALGORITHMS', ['HS256'])
+
+    # How signatures are checked while looking for the key, ``pyjwt``,
+    # ``cryptography`` or any ``VerifierBackend`` instance
+    settings.setdefault('JWT_VERIFIER_BACKEND', 'pyjwt')
+
+    # Store to check ``jti`` of the tokens against, see ``revocation`` module
+    settings.setdefault('JWT_REVOCATION_STORE', None)
 
-        # What algorithm to use to sign the token. See here for a list of options:
-        # https://github.com/jpadilla/pyjwt/blob/master/jwt/api_jwt.py
-        app.config.setdefault('JWT_ALGORITHM', 'RS256')
+    # RFC 7662 endpoint to verify opaque, non JWT, tokens with, and
+    # ``(client_id, client_secret)`` to authenticate there
+    settings.setdefault('JWT_INTROSPECTION_URL', None)
+    settings.setdefault('JWT_INTROSPECTION_AUTH', None)
+    settings.setdefault('JWT_INTROSPECTION_TIMEOUT', 5)
+    # Active tokens cached until their ``exp``, at most this many
+    settings.setdefault('JWT_INTROSPECTION_CACHE_SIZE', 1024)
 
-        # Expected value of the audience claim
-        app.config.setdefault('JWT_IDENTITY', None)
+    # Claim verified tokens are rate limited by, e.g. ``sub``, ``None`` to
+    # disable, with requests per second and burst allowed per claim value
+    settings.setdefault('JWT_RATE_LIMIT_CLAIM', None)
+    settings.setdefault('JWT_RATE_LIMIT_RATE', 10)
+    settings.setdefault('JWT_RATE_LIMIT_BURST', 20)
+    # Any ``RateLimitBackend``, or size of the in process buckets table
+    settings.setdefault('JWT_RATE_LIMIT_BACKEND', None)
+    settings.setdefault('JWT_RATE_LIMIT_TABLE_SIZE', 10000)
 
-        # Whether or not to disable audience verification
-        app.config.setdefault('VERIFY_AUD', True)
+    # Path to serve ``JWTConsumer.snapshot()`` at as JSON, ``None`` to not,
+    # to requests with valid token, having the scope when one is set. Both
+    # have to be set before init_app
+    settings.setdefault('JWT_STATS_ENDPOINT', None)
+    settings.setdefault('JWT_STATS_SCOPE', None)
 
-        # Key to verify JWTs with when use when using an asymmetric
-        # (public/private key) algorithms, such as RS* or EC*
-        app.config.setdefault('JWT_AUTHORIZED_KEYS', None)
+    # Render AuthError as JSON with WWW-Authenticate header, has to be set
+    # before init_app
+    settings.setdefault('JWT_REGISTER_ERROR_HANDLER', False)
@@ -1,87 +1,286 @@
+import time
+from collections import namedtuple
+
 import jwt
-from flask import _request_ctx_stack, request
+from flask import _request_ctx_stack, current_app, request
 
 from .config import config
+from . import errors
 from .errors import AuthError
+from .keyring import HMACKey
+from .tenants import tenant_of
+from .tokens import parse_token
+
+
+# Where verified claims are left for the app by WSGI middleware, with the
+# config they were verified with
+ENVIRON_KEY = 'flask_jwt_consumer.payload'
+ENVIRON_CONFIG_KEY = 'flask_jwt_consumer.config'
+
+MATCH = 'match'
+MISMATCH = 'signature_mismatch'
+MALFORMED = 'malformed'
+
+# Claims decoded while the key was looked for, ``None`` when left to PyJWT
+KeyResult = namedtuple('KeyResult', 'status key claims', defaults=(None,))
+
+
+def _find_key(token, keys, algorithm, verifier, stats=None):
+    """
+    Looping through the keys to find one which is good, nothing is raised.
+
+    :param token: ``tokens.Token``
+    :param stats: ``stats.Stats`` to record keys tried and the match with
+    :return: ``KeyResult``, ``MALFORMED`` when signed payload is not a JSON object
+    """
+    if token.algorithm != algorithm:
+        return KeyResult(MISMATCH, None)
+    tried = 0
+    for key in keys:
+        tried += 1
+        if verifier.verify(token, key, algorithm):
+            claims = None
+            if not token.exotic:
+                claims = token.claims()
+                if claims is None:
+                    return KeyResult(MALFORMED, None)
+            if stats is not None:
+                stats.searched(tried, key)
+            return KeyResult(MATCH, key, claims)
+    if stats is not None:
+        stats.searched(tried)
+    return KeyResult(MISMATCH, None)
+
+
+def _find_hmac_key(token, keyring, stats=None):
+    """HMAC secret of the token, by its ``kid``, or any when there is no ``kid``."""
+    if keyring is None:
+        return KeyResult(MISMATCH, None)
+    kid = token.header.get('kid')
+    if kid is not None:
+        key = keyring.get(kid)
+        keys = (key,) if key is not None else ()
+    else:
+        keys = keyring
+    tried = 0
+    for key in keys:
+        tried += 1
+        if key.verify(token.signing_input, token.signature, token.algorithm):
+            claims = None
+            if not token.exotic:
+                claims = token.claims()
+                if claims is None:
+                    return KeyResult(MALFORMED, None)
+            if stats is not None:
+                stats.searched_hmac(tried, key.kid)
+            return KeyResult(MATCH, key, claims)
+    if stats is not None:
+        stats.searched_hmac(tried)
+    return KeyResult(MISMATCH, None)
+
+
+def _select_key(token, cfg=config):
+    """Finds the key for raw token, malformed ones are rejected before any key is tried."""
+    parsed = parse_token(token)
+    if parsed is None:
+        return KeyResult(MALFORMED, None)
+    if parsed.algorithm in cfg.hmac_algorithms:
+        return _find_hmac_key(parsed, cfg.hmac_keyring, cfg.stats)
+    return _find_key(parsed, cfg.decode_keys, cfg.algorithm, cfg.verifier, cfg.stats)
 
-def _brute_force_key(token):
+
+def _brute_force_key(token, cfg=config):
     """Looping through all the available keys to find one which is good."""
-    valid_key = None
-    for key in config.decode_keys:
-        try:
-            jwt.decode(
-                token,
-                key,
-                algorithms=[config.algorithm],
-                options={
-                    'verify_signature': True,
-                    'verify_exp': False,
-                    'verify_nbf': False,
-                    'verify_iat': False,
-                    'verify_aud': False,
-                    'verify_iss': False,
-                    'require_exp': False,
-                    'require_iat': False,
-                    'require_nbf': False
-                }
-            )
-            valid_key = key
-        except jwt.PyJWTError:
-            pass
-
-        if valid_key:
-            break
-
-    return valid_key
-
-
-def get_jwt_raw():
-    if config.use_cookie == True:
-        return get_jwt_from_cookie()
+    return _select_key(token, cfg).key
+
+
+def _current_config():
+    """Config of the tenant consumer picked for the request, or of the app."""
+    consumer = tenant_of(current_app, request)
+    return consumer.config if consumer is not None else config
+
+
+# PyJWT claims checks, all of them, with the signature left out, it is
+# verified by the backend while looking for the key
+_CLAIMS_OPTIONS = dict(jwt.PyJWT().options, verify_signature=False)
+_CLAIMS_OPTIONS_NO_AUD = dict(_CLAIMS_OPTIONS, verify_aud=False)
+_claims_validator = jwt.PyJWT()
+
+
+def _decode_payload(token, key, cfg=config, claims=None):
+    """
+    Claims of the token signed with the key found, claims and revocation are checked.
+
+    Signature is not verified again, ``key`` is the one ``_select_key`` matched.
+    Claims it decoded are given as ``claims`` and checked by PyJWT the same way
+    ``jwt.decode`` does, without splitting and decoding the token once more.
+    Without them the token is parsed here.
+    """
+    algorithms = cfg.algorithm
+    if isinstance(key, HMACKey):
+        algorithms = list(cfg.hmac_algorithms)
+    options = _CLAIMS_OPTIONS_NO_AUD if cfg.verify_aud is False else _CLAIMS_OPTIONS
+    audience = cfg.audience or None
+    try:
+        payload = claims
+        if payload is None:
+            parsed = parse_token(token)
+            if parsed is not None and not parsed.exotic:
+                payload = parsed.claims()
+        if payload is None:
+            # Less common headers are left to PyJWT altogether
+            payload = jwt.decode(token, algorithms=algorithms, options=options,
+                                 audience=audience)
+        else:
+            _claims_validator._validate_claims(payload, options, audience=audience)
+    except jwt.ExpiredSignatureError:
+        raise AuthError(errors.TOKEN_EXPIRED, 401)
+    except (jwt.InvalidAudienceError, jwt.InvalidIssuerError, jwt.InvalidIssuedAtError):
+        raise AuthError(errors.INVALID_CLAIMS, 401)
+    except jwt.MissingRequiredClaimError:
+        raise AuthError(errors.MISSING_CLAIMS, 401)
+    except jwt.PyJWTError:
+        raise AuthError(errors.INVALID_TOKEN, 401)
+
+    _check_revoked(payload, cfg)
+    return payload
+
+
+def _check_revoked(payload, cfg=config):
+    store = cfg.revocation_store
+    jti = payload.get('jti')
+    if store is not None and jti is not None and store.is_revoked(jti):
+        raise AuthError(errors.TOKEN_REVOKED, 401)
+
+
+def _introspect_payload(token, cfg=config):
+    """
+    Claims of opaque token from the introspection endpoint.
+
+    :return: ``None`` when introspection is off or the token is JWT, which is
+        verified with the keys as usual
+    """
+    introspector = cfg.introspector
+    if introspector is None or parse_token(token) is not None:
+        return None
+    payload = introspector.introspect(token)
+    if payload.get('active') is not True:
+        raise AuthError(errors.TOKEN_INACTIVE, 401)
+    exp = payload.get('exp')
+    if isinstance(exp, (int, float)) and exp <= time.time():
+        raise AuthError(errors.TOKEN_EXPIRED, 401)
+    audience = cfg.audience
+    if audience and cfg.verify_aud is not False:
+        aud = payload.get('aud')
+        if aud is None:
+            raise AuthError(errors.MISSING_CLAIMS, 401)
+        if audience not in ([aud] if isinstance(aud, str) else aud):
+            raise AuthError(errors.INVALID_CLAIMS, 401)
+    _check_revoked(payload, cfg)
+    return payload
+
+
+def _verify_token(token, cfg=config):
+    """
+    Claims of raw token, the one verification path of decorator and middleware.
+
+    Raises ``AuthError`` when the token is malformed, no key matches or the
+    claims are not right.
+    """
+    result = _select_key(token, cfg)
+    if result.status == MATCH:
+        return _decode_payload(token, result.key, cfg, result.claims)
+    if result.status == MALFORMED:
+        payload = _introspect_payload(token, cfg)
+        if payload is not None:
+            return payload
+        raise AuthError(errors.INVALID_TOKEN, 401)
+    raise AuthError(errors.NO_KEY, 401)
+
+
+def _environ_payload(environ, cfg):
+    """
+    Claims verified by the WSGI middleware, only if it used ``cfg`` settings.
+
+    Middleware does not know the tenants, claims it verified with the app keys
+    are no good for the tenant the request belongs to.
+    """
+    verified_with = environ.get(ENVIRON_CONFIG_KEY)
+    if verified_with is None or verified_with._settings is not cfg._settings:
+        return None
+    return environ.get(ENVIRON_KEY)
+
+
+def get_jwt_raw(cfg=None):
+    if cfg is None:
+        cfg = _current_config()
+    if cfg.use_cookie == True:
+        return get_jwt_from_cookie(cfg)
     else:
-        return get_jwt_from_header()
+        return get_jwt_from_header(cfg)
 
-def get_jwt_from_cookie():
-    auth = request.cookies.get(config.cookie_name, None)
+def _check_token_size(token, slack=0, cfg=config):
+    """Drops oversized junk before anything gets decoded."""
+    max_length = cfg.max_token_length
+    if max_length is not None and len(token) > max_length + slack:
+        raise AuthError(errors.TOKEN_TOO_LONG, 401)
+    max_segments = cfg.max_token_segments
+    if max_segments is not None and token.count('.') >= max_segments:
+        raise AuthError(errors.TOKEN_TOO_MANY_SEGMENTS, 401)
+
+
+def _token_from_cookie(auth, cfg=config):
     if not auth:
-        raise AuthError({'code': 'authorization_cookie_missing',
-                        'description': 'Authorization cookie is expected.'},
-                        401)
-    
+        raise AuthError(errors.AUTHORIZATION_COOKIE_MISSING, 401)
+
+    _check_token_size(auth, cfg=cfg)
     return auth
 
-# Format error response and append status code
-def get_jwt_from_header():
-    """Obtains the Access Token from the Authorization Header."""
-    auth = request.headers.get(config.header_name, None)
+
+def _token_from_header(auth, cfg=config):
+    """Takes the token out of the header value."""
     if not auth:
-        raise AuthError({'code': 'authorization_header_missing',
-                        'description': 'Authorization header is expected.'},
-                        401)
+        raise AuthError(errors.AUTHORIZATION_HEADER_MISSING, 401)
 
+    header_type = cfg.header_type
+    # Checked as a whole first, not to split megabytes of junk
+    _check_token_size(auth, slack=len(header_type) + 1, cfg=cfg)
     parts = auth.split()
 
-    if parts[0] != config.header_type:
+    if not parts or parts[0] != header_type:
         raise AuthError({'code': 'invalid_header',
-                        'description': 'Authorization header must start with {}.'.format(config.header_type)},
+                        'description': 'Authorization header must start with {}.'.format(header_type)},
                         401)
     elif len(parts) == 1:
-        raise AuthError({'code': 'invalid_header',
-                        'description': 'Token not found.'},
-                        401)
+        raise AuthError(errors.TOKEN_NOT_FOUND, 401)
     elif len(parts) > 2:
         raise AuthError({'code': 'invalid_header',
-                        'description': 'Authorization header must be {} token.'.format(config.header_type)},
+                        'description': 'Authorization header must be {} token.'.format(header_type)},
                         401)
 
     token = parts[1]
+    _check_token_size(token, cfg=cfg)
     return token
 
 
+def get_jwt_from_cookie(cfg=config):
+    return _token_from_cookie(request.cookies.get(cfg.cookie_name, None), cfg)
+
+# Format error response and append status code
+def get_jwt_from_header(cfg=config):
+    """Obtains the Access Token from the Authorization Header."""
+    return _token_from_header(request.headers.get(cfg.header_name, None), cfg)
+
+
 def get_jwt_payload():
     """
     Returns the python dictionary which has all of the data in this JWT.
 
     If no JWT is currently present, and empty dict is returned
     """
-    return getattr(_request_ctx_stack.top, 'jwt_payload', {})
+    ctx = _request_ctx_stack.top
+    payload = getattr(ctx, 'jwt_payload', None)
+    if payload is None and ctx is not None:
+        # Verified by the WSGI middleware, before flask got the request
+        payload = _environ_payload(ctx.request.environ, _current_config())
+    return payload if payload is not None else {}
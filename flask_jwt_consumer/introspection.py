@@ -0,0 +1,182 @@
+""" RFC 7662 introspection of opaque, non JWT, access tokens."""
+import base64
+import http.client
+import json
+import queue
+import threading
+import time
+from collections import OrderedDict
+from urllib.parse import urlencode, urlsplit
+
+from . import errors
+from .errors import AuthError
+from .stats import CacheInfo
+
+
+class _Call(object):
+    """Introspection request in flight, shared by everyone asking for the same token."""
+
+    __slots__ = ('done', 'response', 'error')
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.response = None
+        self.error = None
+
+
+class Introspector(object):
+    """
+    Client of the introspection endpoint.
+
+    Connections are kept alive and pooled, responses of active tokens are
+    cached until their ``exp``, and concurrent lookups of the same token are
+    merged into one request, so the endpoint sees at most one request per
+    token per process.
+    """
+
+    def __init__(self, url, auth=None, timeout=5.0, cache_size=1024, pool_size=4,
+                 clock=time.time):
+        """
+        :param url: introspection endpoint, ``http`` or ``https``
+        :param auth: ``(client_id, client_secret)`` for HTTP Basic authentication
+        :param timeout: seconds to connect and to wait for the response
+        :param cache_size: active tokens kept at most, least recently used are dropped
+        :param pool_size: idle connections kept at most
+        """
+        parts = urlsplit(url)
+        if parts.scheme == 'https':
+            self._connection_class = http.client.HTTPSConnection
+        elif parts.scheme == 'http':
+            self._connection_class = http.client.HTTPConnection
+        else:
+            raise RuntimeError('JWT_INTROSPECTION_URL must be http or https URL, '
+                               'got "{}"'.format(url))
+        self._host = parts.hostname
+        self._port = parts.port
+        self._path = parts.path or '/'
+        if parts.query:
+            self._path += '?' + parts.query
+        self._headers = {'Content-Type': 'application/x-www-form-urlencoded',
+                         'Accept': 'application/json'}
+        if auth:
+            credentials = '{}:{}'.format(*auth).encode('utf-8')
+            self._headers['Authorization'] = 'Basic ' + base64.b64encode(credentials).decode('ascii')
+        self.timeout = timeout
+        self.cache_size = cache_size
+        self._clock = clock
+        self._pool = queue.LifoQueue(pool_size)
+        self._cache = OrderedDict()
+        self._calls = {}
+        self._lock = threading.Lock()
+        self.hits = self.misses = 0
+
+    def introspect(self, token):
+        """
+        Introspection response of the token, ``active`` is to be checked by the caller.
+
+        Raises ``AuthError`` with 503 status when the endpoint is not reachable
+        or gives back anything but JSON object.
+        """
+        with self._lock:
+            cached = self._cache.get(token)
+            if cached is not None:
+                if cached[0] > self._clock():
+                    self._cache.move_to_end(token)
+                    self.hits += 1
+                    return cached[1]
+                del self._cache[token]
+            self.misses += 1
+            call = self._calls.get(token)
+            leader = call is None
+            if leader:
+                call = self._calls[token] = _Call()
+
+        if not leader:
+            call.done.wait()
+            if isinstance(call.error, AuthError):
+                raise call.error
+            if call.error is not None:
+                # Whatever broke the leader is its to report, here it is
+                # just the endpoint not giving an answer
+                raise AuthError(errors.INTROSPECTION_UNAVAILABLE, 503) from call.error
+            return call.response
+
+        try:
+            call.response = self._request(token)
+        except Exception as error:
+            call.error = error
+            raise
+        finally:
+            with self._lock:
+                del self._calls[token]
+                self._store(token, call.response)
+            call.done.set()
+        return call.response
+
+    def _store(self, token, response):
+        """Caches active token until its ``exp``, tokens without ``exp`` are not."""
+        if not response or not response.get('active'):
+            return
+        exp = response.get('exp')
+        if not isinstance(exp, (int, float)) or exp <= self._clock():
+            return
+        self._cache[token] = (exp, response)
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+
+    def _connection(self):
+        try:
+            return self._pool.get_nowait()
+        except queue.Empty:
+            return self._connection_class(self._host, self._port, timeout=self.timeout)
+
+    def _release(self, connection):
+        try:
+            self._pool.put_nowait(connection)
+        except queue.Full:
+            connection.close()
+
+    def _request(self, token):
+        body = urlencode({'token': token, 'token_type_hint': 'access_token'})
+        # Pooled connection could have been closed by the server meanwhile,
+        # so the request is tried once again on a fresh one
+        for attempt in range(2):
+            connection = self._connection()
+            try:
+                connection.request('POST', self._path, body, self._headers)
+                response = connection.getresponse()
+                data = response.read()
+            except (OSError, http.client.HTTPException):
+                connection.close()
+                if attempt:
+                    raise AuthError(errors.INTROSPECTION_UNAVAILABLE, 503)
+                continue
+            if response.will_close:
+                connection.close()
+            else:
+                self._release(connection)
+            break
+
+        if response.status != 200:
+            raise AuthError(errors.INTROSPECTION_UNAVAILABLE, 503)
+        try:
+            result = json.loads(data.decode('utf-8'))
+        except ValueError:
+            raise AuthError(errors.INTROSPECTION_UNAVAILABLE, 503)
+        if not isinstance(result, dict):
+            raise AuthError(errors.INTROSPECTION_UNAVAILABLE, 503)
+        return result
+
+    def __len__(self):
+        return len(self._cache)
+
+    def cache_info(self):
+        return CacheInfo(self.hits, self.misses, self.cache_size, len(self._cache))
+
+    def close(self):
+        """Closes idle connections."""
+        while True:
+            try:
+                self._pool.get_nowait().close()
+            except queue.Empty:
+                return
@@ -0,0 +1,93 @@
+""" Symmetric HMAC secrets, looked up by ``kid``."""
+import hashlib
+import hmac
+
+HMAC_ALGORITHMS = {
+    'HS256': hashlib.sha256,
+    'HS384': hashlib.sha384,
+    'HS512': hashlib.sha512,
+}
+
+
+class HMACKey(object):
+    """
+    HMAC secret with its keyed hash objects prepared up front.
+
+    Verification copies prepared object, so the key is not hashed in
+    again for every token.
+    """
+
+    __slots__ = ('kid', 'secret', '_macs')
+
+    def __init__(self, kid, secret, algorithms):
+        self.kid = kid
+        self.secret = secret.encode('utf-8') if isinstance(secret, str) else secret
+        self._macs = {algorithm: hmac.new(self.secret, digestmod=HMAC_ALGORITHMS[algorithm])
+                      for algorithm in algorithms}
+
+    def verify(self, signing_input, signature, algorithm):
+        """Constant time check of the signature, ``False`` for algorithms not allowed."""
+        mac = self._macs.get(algorithm)
+        if mac is None:
+            return False
+        mac = mac.copy()
+        mac.update(signing_input)
+        return hmac.compare_digest(mac.digest(), signature)
+
+    def __repr__(self):
+        return '<HMACKey kid={!r}>'.format(self.kid)
+
+
+class HMACKeyring(object):
+    """
+    Set of HMAC secrets, indexed by ``kid``.
+
+    Kept apart from ``JWT_AUTHORIZED_KEYS``, secrets are only ever used with
+    the HMAC algorithms allowed for the keyring, and public keys never are.
+    """
+
+    def __init__(self, secrets, algorithms=('HS256',)):
+        """
+        :param secrets: mapping of ``kid`` to secret
+        :param algorithms: HMAC algorithms tokens are allowed to use
+        """
+        unknown = set(algorithms) - set(HMAC_ALGORITHMS)
+        if unknown:
+            raise RuntimeError('JWT_HMAC_ALGORITHMS only accepts {}, got "{}"'.format(
+                ', '.join(sorted(HMAC_ALGORITHMS)), ', '.join(sorted(unknown))))
+        self.algorithms = frozenset(algorithms)
+        self._keys = {kid: HMACKey(kid, secret, self.algorithms)
+                      for kid, secret in secrets.items()}
+
+    @staticmethod
+    def parse(text):
+        """
+        Secrets out of ``authorized_keys`` like text, ``kid secret`` per line.
+
+        Empty lines and lines starting with ``#`` are skipped.
+        """
+        secrets = {}
+        for line in text.splitlines():
+            line = line.strip()
+            if not line or line.startswith('#'):
+                continue
+            kid, _, secret = line.partition(' ')
+            secret = secret.strip()
+            if not secret:
+                raise RuntimeError('HMAC key "{}" has no secret'.format(kid))
+            secrets[kid] = secret
+        return secrets
+
+    @classmethod
+    def from_file(cls, path, algorithms=('HS256',)):
+        with open(path, 'r') as stream:
+            return cls(cls.parse(stream.read()), algorithms)
+
+    def get(self, kid):
+        return self._keys.get(kid)
+
+    def __iter__(self):
+        return iter(self._keys.values())
+
+    def __len__(self):
+        return len(self._keys)
@@ -0,0 +1,85 @@
+""" WSGI middleware, verifies tokens before the app gets the request."""
+from werkzeug.http import HTTP_STATUS_CODES, parse_cookie
+from werkzeug.wsgi import get_host
+
+from .config import _Config
+from .errors import AuthError
+from .flask_jwt_consumer import _set_defaults
+from .helpers import (ENVIRON_CONFIG_KEY, ENVIRON_KEY, _token_from_cookie,
+                      _token_from_header, _verify_token)
+
+
+class JWTMiddleware(object):
+    """
+    Verifies JWT of every request, rejected ones never reach the app.
+
+    Verified claims are left in ``environ['flask_jwt_consumer.payload']``,
+    ``get_jwt_payload`` and ``requires_jwt`` pick them from there, so tokens
+    are not verified twice. Works in front of any WSGI app::
+
+        app.wsgi_app = JWTMiddleware(app.wsgi_app, app.config)
+
+    Tokens are verified with ``settings`` keys only. With named ``JWTConsumer``
+    instances their selector is to be given as ``tenants``, requests claimed
+    by a tenant are let through and left to ``requires_jwt``::
+
+        app.wsgi_app = JWTMiddleware(app.wsgi_app, app.config,
+                                     tenants=selector_of(app))
+
+    Without it tenant requests have to pass the app keys here, and then
+    ``requires_jwt`` rejects them, as those claims are not of the tenant.
+    """
+
+    def __init__(self, app, settings=None, exempt=(), tenants=None):
+        """
+        :param app: WSGI app to protect
+        :param settings: mapping with the same options as flask ``app.config``,
+            defaults are filled in
+        :param exempt: path prefixes which are let through without a token,
+            matched by whole segments
+        :param tenants: ``TenantSelector`` of the app, see ``selector_of``
+        """
+        self.app = app
+        settings = settings if settings is not None else {}
+        _set_defaults(settings)
+        self.config = _Config(settings)
+        self.exempt = tuple('/' + prefix.strip('/') for prefix in exempt)
+        # Whole segments only, ``/health`` is not to let ``/health-admin`` through
+        self._exempt_paths = frozenset(self.exempt)
+        self._exempt_dirs = tuple(prefix.rstrip('/') + '/' for prefix in self.exempt)
+        self.tenants = tenants
+        header_name = settings['JWT_HEADER_NAME'] or ''
+        self._environ_header = 'HTTP_' + header_name.upper().replace('-', '_')
+
+    def _token(self, environ):
+        cfg = self.config
+        if cfg.use_cookie:
+            cookies = parse_cookie(environ.get('HTTP_COOKIE', ''))
+            return _token_from_cookie(cookies.get(cfg.cookie_name), cfg)
+        return _token_from_header(environ.get(self._environ_header), cfg)
+
+    def verify(self, environ):
+        """Claims of the request token, raises ``AuthError`` otherwise."""
+        return _verify_token(self._token(environ), self.config)
+
+    def __call__(self, environ, start_response):
+        if self.exempt:
+            path = environ.get('PATH_INFO', '')
+            if path in self._exempt_paths or path.startswith(self._exempt_dirs):
+                return self.app(environ, start_response)
+        tenants = self.tenants
+        if tenants is not None and tenants.select(get_host(environ),
+                                                  environ.get('PATH_INFO', '')):
+            return self.app(environ, start_response)
+        try:
+            environ[ENVIRON_KEY] = self.verify(environ)
+            environ[ENVIRON_CONFIG_KEY] = self.config
+        except AuthError as error:
+            self.config.stats.failed(error)
+            body, headers = error.render(self.config.header_type)
+            status = '{} {}'.format(error.code, HTTP_STATUS_CODES.get(error.code, ''))
+            start_response(status, [('Content-Type', 'application/json'),
+                                    ('Content-Length', str(len(body)))]
+                           + list(headers))
+            return [body]
+        return self.app(environ, start_response)
@@ -0,0 +1,96 @@
+""" Per subject rate limiting of verified tokens, by token bucket."""
+import math
+import threading
+import time
+from collections import OrderedDict
+
+from . import errors
+from .errors import AuthError
+
+
+class RateLimitBackend(object):
+    """
+    Where token buckets are kept.
+
+    In process table is per worker, for limits shared by all the workers
+    subclass it over a shared store, e.g. Redis script doing the same
+    arithmetic as ``MemoryRateLimitBackend.consume`` atomically.
+    """
+
+    def consume(self, key, rate, burst):
+        """
+        Takes one token out of the ``key`` bucket.
+
+        :param rate: tokens added per second
+        :param burst: bucket size
+        :return: ``0`` when the token is taken, seconds until the next one otherwise
+        """
+        raise NotImplementedError
+
+
+class MemoryRateLimitBackend(RateLimitBackend):
+    """
+    Buckets in a bounded in process table, least recently used are dropped.
+
+    Bucket is ``(tokens, updated)`` tuple, dropped bucket is as good as full,
+    so the table size only has to cover the subjects active at once.
+    """
+
+    def __init__(self, max_size=10000, clock=time.monotonic):
+        self.max_size = max_size
+        self._clock = clock
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+
+    def consume(self, key, rate, burst):
+        buckets = self._buckets
+        with self._lock:
+            now = self._clock()
+            bucket = buckets.get(key)
+            if bucket is None:
+                tokens = burst
+            else:
+                tokens = min(burst, bucket[0] + (now - bucket[1]) * rate)
+                buckets.move_to_end(key)
+            if tokens >= 1:
+                buckets[key] = (tokens - 1, now)
+                wait = 0
+            else:
+                buckets[key] = (tokens, now)
+                wait = (1 - tokens) / rate
+            if len(buckets) > self.max_size:
+                buckets.popitem(last=False)
+        return wait
+
+    def __len__(self):
+        return len(self._buckets)
+
+
+class RateLimiter(object):
+    """Rejects verified tokens over the rate of their ``claim`` value."""
+
+    def __init__(self, claim, rate, burst, backend=None):
+        """
+        :param claim: claim to key buckets on, e.g. ``sub``, ``client_id`` or ``iss``
+        :param rate: requests per second allowed in the long run
+        :param burst: requests allowed at once
+        :param backend: ``RateLimitBackend``, in process table by default
+        """
+        if rate <= 0 or burst < 1:
+            raise RuntimeError('JWT_RATE_LIMIT_RATE has to be positive and '
+                               'JWT_RATE_LIMIT_BURST at least 1')
+        self.claim = claim
+        self.rate = rate
+        self.burst = burst
+        self.backend = backend if backend is not None else MemoryRateLimitBackend()
+
+    def check(self, payload):
+        """Raises ``AuthError`` with 429 status and ``Retry-After`` when over the limit."""
+        # Tokens without the claim share one bucket, not to go unlimited
+        key = payload.get(self.claim)
+        if not isinstance(key, str):
+            key = str(key)
+        wait = self.backend.consume(key, self.rate, self.burst)
+        if wait:
+            raise AuthError(errors.RATE_LIMITED, 429,
+                            {'Retry-After': str(max(1, int(math.ceil(wait))))})
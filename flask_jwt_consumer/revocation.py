@@ -0,0 +1,264 @@
+""" Revoked tokens bookkeeping, keyed by ``jti`` claim."""
+import hashlib
+import heapq
+import json
+import math
+import struct
+import threading
+import time
+
+
+class RevocationStore(object):
+    """
+    Interface for revoked tokens storage.
+
+    Subclass it to back revocation by a shared database or cache, only
+    ``revoke`` and ``is_revoked`` are required.
+    """
+
+    def revoke(self, jti, exp=None):
+        """
+        Mark token as revoked.
+
+        :param jti: token ``jti`` claim
+        :param exp: token ``exp`` claim, entry could be dropped after that time
+        """
+        raise NotImplementedError
+
+    def is_revoked(self, jti):
+        """Whether or not token with given ``jti`` was revoked."""
+        raise NotImplementedError
+
+    def __iter__(self):
+        """Iterates over revoked ``jti``, if storage can afford it."""
+        return iter(())
+
+    def entries(self):
+        """``(jti, exp)`` pairs of revoked tokens, ``exp`` is ``None`` when not known."""
+        return [(jti, None) for jti in self]
+
+
+class MemoryRevocationStore(RevocationStore):
+    """
+    In process revoked tokens set.
+
+    Entries are dropped once their ``exp`` has passed, token would be rejected
+    as expired anyway.
+    """
+
+    def __init__(self, clock=time.time):
+        self._clock = clock
+        self._entries = {}
+        self._expiry = []
+        self._lock = threading.Lock()
+
+    def revoke(self, jti, exp=None):
+        with self._lock:
+            self._entries[jti] = exp
+            if exp is not None:
+                heapq.heappush(self._expiry, (exp, jti))
+
+    def is_revoked(self, jti):
+        self._evict()
+        return jti in self._entries
+
+    def _evict(self):
+        expiry = self._expiry
+        now = self._clock()
+        with self._lock:
+            while expiry and expiry[0][0] <= now:
+                exp, jti = heapq.heappop(expiry)
+                # Same jti might have been revoked again with a later exp
+                if self._entries.get(jti, exp) == exp:
+                    self._entries.pop(jti, None)
+
+    def __iter__(self):
+        self._evict()
+        return iter(list(self._entries))
+
+    def entries(self):
+        self._evict()
+        with self._lock:
+            return list(self._entries.items())
+
+    def __len__(self):
+        self._evict()
+        return len(self._entries)
+
+
+class BloomFilter(object):
+    """
+    Compact probabilistic set of strings.
+
+    Never gives false negatives, so anything it does not contain is known
+    not to be in the set without any further lookup.
+    """
+
+    _HEADER = struct.Struct('>4sII')
+    _MAGIC = b'JWTB'
+
+    def __init__(self, num_bits, num_hashes, bits=None):
+        if num_bits < 8 or num_hashes < 1:
+            raise ValueError('BloomFilter needs at least 8 bits and 1 hash')
+        self.num_bits = num_bits
+        self.num_hashes = num_hashes
+        size = (num_bits + 7) // 8
+        if bits is None:
+            bits = bytearray(size)
+        elif len(bits) != size:
+            raise ValueError('BloomFilter bits do not match its size')
+        self._bits = bytearray(bits)
+        self._lock = threading.Lock()
+
+    @classmethod
+    def for_capacity(cls, capacity, error_rate=0.001):
+        """Sizes the filter for expected number of items and false positive rate."""
+        capacity = max(capacity, 1)
+        num_bits = int(math.ceil(-capacity * math.log(error_rate) / (math.log(2) ** 2)))
+        num_hashes = int(round(num_bits / capacity * math.log(2)))
+        return cls(max(num_bits, 8), max(num_hashes, 1))
+
+    @classmethod
+    def load(cls, stream):
+        """Reads filter previously written with ``dump`` from binary stream."""
+        header = stream.read(cls._HEADER.size)
+        if len(header) != cls._HEADER.size:
+            raise ValueError('Truncated BloomFilter header')
+        magic, num_bits, num_hashes = cls._HEADER.unpack(header)
+        if magic != cls._MAGIC:
+            raise ValueError('Not a BloomFilter stream')
+        return cls(num_bits, num_hashes, stream.read((num_bits + 7) // 8))
+
+    @classmethod
+    def from_file(cls, path):
+        with open(path, 'rb') as stream:
+            return cls.load(stream)
+
+    def dump(self, stream):
+        stream.write(self._HEADER.pack(self._MAGIC, self.num_bits, self.num_hashes))
+        stream.write(bytes(self._bits))
+
+    def _positions(self, item):
+        digest = hashlib.blake2b(item.encode('utf-8'), digest_size=16).digest()
+        first, second = struct.unpack('>QQ', digest)
+        num_bits = self.num_bits
+        return [(first + i * second) % num_bits for i in range(self.num_hashes)]
+
+    def add(self, item):
+        positions = self._positions(item)
+        with self._lock:
+            for position in positions:
+                self._bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, item):
+        bits = self._bits
+        for position in self._positions(item):
+            if not bits[position >> 3] & (1 << (position & 7)):
+                return False
+        return True
+
+
+class BloomRevocationStore(RevocationStore):
+    """
+    Revocation store fronted by a Bloom filter.
+
+    Most of the tokens are not revoked, those are cleared by the filter with a
+    few hash operations, only possible hits go to the backing store.
+
+    Filter hit is only a maybe, the backing store has the final say. Filter
+    alone, e.g. ``BloomFilter.from_file``, revokes nothing with the in process
+    store after a restart; ``dump`` writes the store entries along with the
+    filter, ``load``, ``from_file`` and ``reload`` read them back.
+    """
+
+    def __init__(self, store=None, bloom=None):
+        self.store = store if store is not None else MemoryRevocationStore()
+        self._bloom = bloom
+        # Revocations wait for the filter swap, not to land in the old filter
+        self._lock = threading.Lock()
+
+    @classmethod
+    def load(cls, stream, store=None):
+        """Store with filter and entries written by ``dump``, into ``store`` if given."""
+        bloom, entries = cls._read(stream)
+        revocations = cls(store, bloom)
+        for jti, exp in entries:
+            revocations.revoke(jti, exp)
+        return revocations
+
+    @classmethod
+    def from_file(cls, path, store=None):
+        with open(path, 'rb') as stream:
+            return cls.load(stream, store)
+
+    @staticmethod
+    def _read(stream):
+        bloom = BloomFilter.load(stream)
+        rest = stream.read()
+        if not rest:
+            return bloom, []
+        try:
+            entries = json.loads(rest.decode('utf-8'))
+        except ValueError:
+            raise ValueError('Malformed revocation entries after BloomFilter')
+        return bloom, [(jti, exp) for jti, exp in entries]
+
+    def dump(self, stream):
+        """Writes the filter followed by the entries of the backing store."""
+        with self._lock:
+            entries = self.store.entries()
+            bloom = self._bloom
+            if bloom is None:
+                bloom = BloomFilter.for_capacity(len(entries))
+                for jti, _ in entries:
+                    bloom.add(jti)
+            bloom.dump(stream)
+        stream.write(json.dumps(entries, separators=(',', ':')).encode('utf-8'))
+
+    @property
+    def bloom(self):
+        return self._bloom
+
+    def revoke(self, jti, exp=None):
+        with self._lock:
+            self.store.revoke(jti, exp)
+            bloom = self._bloom
+            if bloom is not None:
+                bloom.add(jti)
+
+    def is_revoked(self, jti):
+        bloom = self._bloom
+        if bloom is not None and jti not in bloom:
+            return False
+        return self.store.is_revoked(jti)
+
+    def reload(self, source):
+        """
+        Replaces the filter with a new one, in one go.
+
+        Entries written along with the filter by ``dump`` go to the backing
+        store, entries known to it are carried over, so nothing revoked in the
+        meantime slips through.
+
+        :param source: ``BloomFilter``, binary stream or path to the file
+        """
+        entries = []
+        if isinstance(source, BloomFilter):
+            bloom = source
+        elif hasattr(source, 'read'):
+            bloom, entries = self._read(source)
+        else:
+            with open(source, 'rb') as stream:
+                bloom, entries = self._read(stream)
+        for jti, exp in entries:
+            self.store.revoke(jti, exp)
+        with self._lock:
+            for jti in self.store:
+                bloom.add(jti)
+            self._bloom = bloom
+
+    def __iter__(self):
+        return iter(self.store)
+
+    def entries(self):
+        return self.store.entries()
@@ -0,0 +1,115 @@
+""" Verification counters, kept per process and read by snapshot."""
+import hashlib
+from collections import Counter, namedtuple
+
+from . import errors
+from .tokens import _parse_header
+
+# Same fields as ``functools.lru_cache`` gives, for the caches kept by hand
+CacheInfo = namedtuple('CacheInfo', 'hits misses maxsize currsize')
+
+
+def _fingerprint(key):
+    raw = key.encode('utf-8') if isinstance(key, str) else key
+    return hashlib.sha256(raw).hexdigest()[:16]
+
+
+def _comment(key):
+    """Comment of OpenSSH formatted key, what is after the key itself."""
+    raw = key.decode('utf-8', 'replace') if isinstance(key, bytes) else key
+    parts = raw.split(None, 2)
+    if len(parts) == 3 and not raw.startswith('-----'):
+        return parts[2]
+    return None
+
+
+class Stats(object):
+    """
+    Counters of key lookups and failures.
+
+    Updated on the request path with no locking, plain integer and counter
+    increments only, so numbers are approximate when threads race. Everything
+    else is worked out in ``snapshot``.
+    """
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.lookups = 0
+        self.keys_tried = 0
+        self.key_matches = Counter()
+        self.hmac_matches = Counter()
+        self.failures = Counter()
+
+    def searched(self, tried, key=None):
+        """Records key lookup, ``key`` is the one matched, if any."""
+        self.lookups += 1
+        self.keys_tried += tried
+        if key is not None:
+            self.key_matches[key] += 1
+
+    def searched_hmac(self, tried, kid=None):
+        self.lookups += 1
+        self.keys_tried += tried
+        if kid is not None:
+            self.hmac_matches[kid] += 1
+
+    def failed(self, error):
+        try:
+            self.failures[error.content['code']] += 1
+        except (KeyError, TypeError):
+            self.failures[None] += 1
+
+    def snapshot(self, cfg):
+        """
+        JSON serializable view of the counters and caches of the config.
+
+        Keys are listed in ``JWT_AUTHORIZED_KEYS`` order, by comment and
+        fingerprint, matches of keys removed since are summed as ``retired``.
+        """
+        settings = cfg._settings
+        matches = dict(self.key_matches)
+        keys = []
+        if settings['JWT_AUTHORIZED_KEYS']:
+            for index, key in enumerate(cfg.decode_keys):
+                keys.append({'index': index,
+                             'comment': _comment(key),
+                             'fingerprint': _fingerprint(key),
+                             'matches': matches.pop(key, 0)})
+        lookups = self.lookups
+        return {
+            'lookups': lookups,
+            'keys_tried': self.keys_tried,
+            'average_keys_tried': self.keys_tried / lookups if lookups else 0.0,
+            'keys': keys,
+            'retired_key_matches': sum(matches.values()),
+            'hmac_keys': dict(self.hmac_matches),
+            'failures': {str(code): count for code, count in self.failures.items()},
+            'caches': self._caches(cfg),
+        }
+
+    @staticmethod
+    def _caches(cfg):
+        caches = {
+            'headers': _cache_info(_parse_header.cache_info()),
+            'rendered_errors': {'size': len(errors._rendered)},
+        }
+        verifier = cfg.verifier
+        if hasattr(verifier, 'cache_info'):
+            caches['verifier'] = _cache_info(verifier.cache_info())
+        settings = cfg._settings
+        if settings['JWT_INTROSPECTION_URL']:
+            caches['introspection'] = _cache_info(cfg.introspector.cache_info())
+        if settings['JWT_RATE_LIMIT_CLAIM']:
+            backend = cfg.rate_limiter.backend
+            if hasattr(backend, '__len__'):
+                caches['rate_limit'] = {'size': len(backend)}
+        return caches
+
+
+def _cache_info(info):
+    lookups = info.hits + info.misses
+    return {'size': info.currsize, 'max_size': info.maxsize,
+            'hits': info.hits, 'misses': info.misses,
+            'hit_rate': info.hits / lookups if lookups else 0.0}
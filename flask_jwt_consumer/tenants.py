@@ -0,0 +1,70 @@
+""" Picking named consumer of the request, by host or path prefix."""
+
+# Where the selector is kept in ``app.extensions``
+EXTENSION_KEY = 'flask-jwt-tenants'
+
+
+def tenant_of(app, request):
+    """Named consumer of the request, ``None`` when it is for the app config."""
+    selector = app.extensions.get(EXTENSION_KEY)
+    if selector is None:
+        return None
+    return selector.select(request.host, request.path)
+
+
+def selector_of(app):
+    """Tenant selector of the app, the same one before and after tenants are added."""
+    return app.extensions.setdefault(EXTENSION_KEY, TenantSelector())
+
+
+class TenantSelector(object):
+    """
+    Named ``JWTConsumer`` instances of one app, indexed for lookup per request.
+
+    Hosts are matched exactly, port aside, path prefixes by whole segments,
+    the longest one wins. Both are dict lookups, so the number of tenants
+    does not slow down the selection.
+    """
+
+    def __init__(self):
+        self.consumers = {}
+        self._hosts = {}
+        self._prefixes = {}
+        self._max_depth = 0
+
+    def add(self, consumer, hosts=(), path_prefixes=()):
+        name = consumer.name
+        if name in self.consumers:
+            raise RuntimeError('JWTConsumer "{}" is registered already'.format(name))
+        for host in hosts:
+            host = host.lower()
+            if host in self._hosts:
+                raise RuntimeError('Host "{}" is taken by JWTConsumer "{}"'.format(
+                    host, self._hosts[host].name))
+            self._hosts[host] = consumer
+        for prefix in path_prefixes:
+            prefix = '/' + prefix.strip('/')
+            if prefix in self._prefixes:
+                raise RuntimeError('Path prefix "{}" is taken by JWTConsumer "{}"'.format(
+                    prefix, self._prefixes[prefix].name))
+            self._prefixes[prefix] = consumer
+            self._max_depth = max(self._max_depth, prefix.count('/'))
+        self.consumers[name] = consumer
+
+    def select(self, host, path):
+        """Consumer of the request, ``None`` when no tenant claims it."""
+        if self._hosts:
+            host = host.lower()
+            consumer = self._hosts.get(host)
+            if consumer is None and ':' in host and not host.endswith(']'):
+                consumer = self._hosts.get(host.rsplit(':', 1)[0])
+            if consumer is not None:
+                return consumer
+        if self._prefixes:
+            # Segments beyond the deepest prefix never matter
+            segments = path.split('/', self._max_depth + 1)[1:self._max_depth + 1]
+            for depth in range(len(segments), 0, -1):
+                consumer = self._prefixes.get('/' + '/'.join(segments[:depth]))
+                if consumer is not None:
+                    return consumer
+        return None
@@ -0,0 +1,101 @@
+""" Splitting and decoding of compact JWS tokens, without exceptions."""
+import base64
+import binascii
+import json
+from functools import lru_cache
+
+
+def _b64decode(segment):
+    """Strict base64url decoding, the same segments PyJWT accepts, or None."""
+    stripped = segment.rstrip(b'=')
+    padding_size = len(segment) - len(stripped)
+    if padding_size > 2 or (padding_size and len(segment) % 4):
+        return None
+    if len(stripped) % 4 == 1:
+        return None
+    padded = stripped + b'=' * (-len(stripped) % 4)
+    try:
+        decoded = base64.b64decode(padded, altchars=b'-_', validate=True)
+    except binascii.Error:
+        return None
+    if base64.urlsafe_b64encode(decoded).rstrip(b'=') != stripped:
+        return None
+    return decoded
+
+
+def _json_object(data):
+    if data is None:
+        return None
+    try:
+        value = json.loads(data)
+    except (ValueError, RecursionError):
+        return None
+    return value if isinstance(value, dict) else None
+
+
+@lru_cache(maxsize=128)
+def _parse_header(segment):
+    """
+    Header segment decoded and checked, ``None`` if it is no good.
+
+    Tokens of the same issuer share a handful of headers, so the result is
+    memoized by the raw segment. Headers are shared, do not modify them.
+    """
+    header = _json_object(_b64decode(segment))
+    if header is None:
+        return None
+    if not header.get('alg') or not isinstance(header.get('kid', ''), str):
+        return None
+    return header
+
+
+class Token(object):
+    """
+    Token split into its parts, header decoded.
+
+    Payload is only decoded on demand, once the signature is known to be good.
+    """
+
+    __slots__ = ('raw', 'header', 'signing_input', 'payload_segment',
+                 'signature', 'exotic')
+
+    def __init__(self, raw, header, signing_input, payload_segment, signature):
+        self.raw = raw
+        self.header = header
+        self.signing_input = signing_input
+        self.payload_segment = payload_segment
+        self.signature = signature
+        # Critical headers and detached payloads are left to PyJWT
+        self.exotic = 'crit' in header or 'b64' in header
+
+    @property
+    def algorithm(self):
+        return self.header.get('alg')
+
+    def claims(self):
+        """Payload as a dict, ``None`` if it is not a JSON object."""
+        return _json_object(_b64decode(self.payload_segment))
+
+
+def parse_token(token):
+    """
+    Splits the token, ``None`` if it is malformed.
+
+    Malformed is anything PyJWT would refuse regardless of the key: wrong
+    segments count, broken base64, header which is not a JSON object, missing
+    ``alg`` or non string ``kid``.
+    """
+    raw = token.encode('utf-8') if isinstance(token, str) else token
+    if not isinstance(raw, bytes):
+        return None
+    signing_input, _, crypto_segment = raw.rpartition(b'.')
+    header_segment, dot, payload_segment = signing_input.partition(b'.')
+    if not dot:
+        return None
+    header = _parse_header(header_segment)
+    if header is None:
+        return None
+    signature = _b64decode(crypto_segment)
+    if signature is None:
+        return None
+    return Token(token, header, signing_input, payload_segment, signature)
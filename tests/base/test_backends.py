@@ -0,0 +1,280 @@
+"""Differential testing of verifier backends."""
+import json
+from unittest import mock
+from unittest.mock import PropertyMock
+
+import jwt
+import pytest
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import ec, ed448, ed25519, rsa
+from jwt.algorithms import get_default_algorithms
+from jwt.utils import base64url_encode
+
+from flask_jwt_consumer import (AuthError, CryptographyBackend, PyJWTBackend,
+                                errors)
+from flask_jwt_consumer.helpers import (MALFORMED, MATCH, MISMATCH,
+                                        _brute_force_key, _decode_payload,
+                                        _find_key, _select_key, _verify_token)
+from flask_jwt_consumer.tokens import Token, parse_token
+
+RSA_KEY = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+OTHER_RSA_KEY = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+P256_KEY = ec.generate_private_key(ec.SECP256R1())
+P384_KEY = ec.generate_private_key(ec.SECP384R1())
+P521_KEY = ec.generate_private_key(ec.SECP521R1())
+ED25519_KEY = ed25519.Ed25519PrivateKey.generate()
+ED448_KEY = ed448.Ed448PrivateKey.generate()
+
+SIGNING_KEYS = {
+    'RS256': RSA_KEY,
+    'RS384': RSA_KEY,
+    'RS512': RSA_KEY,
+    'PS256': RSA_KEY,
+    'PS384': RSA_KEY,
+    'PS512': RSA_KEY,
+    'ES256': P256_KEY,
+    'ES384': P384_KEY,
+    'ES512': P521_KEY,
+    'EdDSA': ED25519_KEY,
+}
+
+ALL_KEYS = [RSA_KEY, OTHER_RSA_KEY, P256_KEY, P384_KEY, P521_KEY,
+            ED25519_KEY, ED448_KEY]
+
+
+def pem(private_key):
+    return private_key.public_key().public_bytes(
+        serialization.Encoding.PEM,
+        serialization.PublicFormat.SubjectPublicKeyInfo).decode('utf-8')
+
+
+def ssh(private_key):
+    return private_key.public_key().public_bytes(
+        serialization.Encoding.OpenSSH,
+        serialization.PublicFormat.OpenSSH).decode('utf-8')
+
+
+def sign(header, payload, private_key, algorithm):
+    """Signs whatever comes in, no questions asked."""
+    if isinstance(header, dict):
+        header = json.dumps(header).encode('utf-8')
+    if isinstance(payload, dict):
+        payload = json.dumps(payload).encode('utf-8')
+    signing_input = base64url_encode(header) + b'.' + base64url_encode(payload)
+    signature = get_default_algorithms()[algorithm].sign(signing_input, private_key)
+    return (signing_input + b'.' + base64url_encode(signature)).decode('utf-8')
+
+
+def token_cases(algorithm):
+    """Tokens which should be and should not be accepted."""
+    private_key = SIGNING_KEYS[algorithm]
+    header = {'alg': algorithm, 'typ': 'JWT'}
+    payload = {'sub': 'someone', 'exp': 1}
+    good = sign(header, payload, private_key, algorithm)
+    head, body, signature = good.split('.')
+    flipped = 'A' if signature[0] != 'A' else 'B'
+    other = 'RS256' if algorithm != 'RS256' else 'RS384'
+    return {
+        'good': good,
+        'tampered_signature': '.'.join([head, body, flipped + signature[1:]]),
+        'tampered_payload': '.'.join([head, body[:-2] + 'xx', signature]),
+        'truncated_signature': '.'.join([head, body, signature[:-4]]),
+        'empty_signature': '.'.join([head, body, '']),
+        'padded_signature': good + '==',
+        'junk_signature': '.'.join([head, body, '!!!!']),
+        'other_alg': sign(dict(header, alg=other), payload, SIGNING_KEYS[other], other),
+        'no_alg': sign({'typ': 'JWT'}, payload, private_key, algorithm),
+        'int_kid': sign(dict(header, kid=1), payload, private_key, algorithm),
+        'str_kid': sign(dict(header, kid='1'), payload, private_key, algorithm),
+        'crit': sign(dict(header, crit=['exp']), payload, private_key, algorithm),
+        'list_header': sign(b'[1, 2]', payload, private_key, algorithm),
+        'list_payload': sign(header, b'[1, 2]', private_key, algorithm),
+        'junk_payload': sign(header, b'not json', private_key, algorithm),
+        'two_segments': '.'.join([head, body]),
+        'four_segments': good + '.more',
+        'garbage': 'not-a-token',
+    }
+
+
+def key_variants():
+    for private_key in ALL_KEYS:
+        yield pem(private_key)
+        if not isinstance(private_key, ed448.Ed448PrivateKey):
+            yield ssh(private_key)
+
+
+CORPUS = [
+    (algorithm, case, key_index)
+    for algorithm in sorted(SIGNING_KEYS)
+    for case in sorted(token_cases('RS256'))
+    for key_index, _ in enumerate(key_variants())
+]
+
+KEYS = list(key_variants())
+TOKENS = {algorithm: token_cases(algorithm) for algorithm in SIGNING_KEYS}
+
+
+def pyjwt_verify(token, key, algorithm):
+    """Reference result, ``jwt.decode`` with claims checks off."""
+    try:
+        jwt.decode(token, key, algorithms=[algorithm],
+                   options={'verify_exp': False, 'verify_aud': False})
+    except (jwt.PyJWTError, ValueError, TypeError):
+        # PyJWT blows up on some key types mismatches, those are rejects too
+        return False
+    return True
+
+
+def backend_verify(backend, token, key, algorithm):
+    parsed = parse_token(token)
+    if parsed is None:
+        return False
+    return _find_key(parsed, [key], algorithm, backend).status == MATCH
+
+
+BACKENDS = [PyJWTBackend(), CryptographyBackend()]
+
+
+class TestBackends:
+    """Test verifier backends."""
+
+    @pytest.mark.parametrize('algorithm', sorted(SIGNING_KEYS))
+    def test_good_token_verifies(self, algorithm):
+        token = TOKENS[algorithm]['good']
+        key = pem(SIGNING_KEYS[algorithm])
+        assert pyjwt_verify(token, key, algorithm)
+        for backend in BACKENDS:
+            assert backend_verify(backend, token, key, algorithm)
+
+    @pytest.mark.parametrize('algorithm,case,key_index', CORPUS)
+    def test_backends_agree(self, algorithm, case, key_index):
+        token = TOKENS[algorithm][case]
+        key = KEYS[key_index]
+        expected = pyjwt_verify(token, key, algorithm)
+        for backend in BACKENDS:
+            assert backend_verify(backend, token, key, algorithm) == expected
+
+    def test_bad_key_is_not_usable(self):
+        backend = CryptographyBackend()
+        assert backend.load_key('ssh-rsa nope') is None
+        token = parse_token(TOKENS['RS256']['good'])
+        assert not backend.verify(token, 'ssh-rsa nope', 'RS256')
+        assert not PyJWTBackend().verify(token, 'ssh-rsa nope', 'RS256')
+
+    def test_unknown_algorithm_falls_back(self):
+        fallback = mock.Mock()
+        fallback.verify.return_value = True
+        backend = CryptographyBackend(fallback=fallback)
+        token = parse_token(TOKENS['RS256']['good'])
+        assert backend.verify(token, 'key', 'HS256')
+        fallback.verify.assert_called_once_with(token, 'key', 'HS256')
+
+    def test_select_key_statuses(self, live_app):
+        keys = [pem(OTHER_RSA_KEY), pem(RSA_KEY)]
+        with mock.patch('flask_jwt_consumer.config._Config.decode_keys',
+                        new_callable=PropertyMock) as fake_decode_keys:
+            fake_decode_keys.return_value = keys
+            assert _select_key(TOKENS['RS256']['good'])[:2] == (MATCH, keys[1])
+            assert _select_key(TOKENS['RS256']['tampered_signature']) == (MISMATCH, None, None)
+            assert _select_key(TOKENS['RS256']['junk_payload']) == (MALFORMED, None, None)
+            assert _select_key(TOKENS['RS256']['garbage']) == (MALFORMED, None, None)
+
+    @pytest.mark.parametrize('case', ['garbage', 'two_segments', 'list_header',
+                                      'int_kid', 'no_alg', 'junk_signature'])
+    def test_malformed_rejected_before_keys(self, live_app, case):
+        verifier = mock.Mock()
+        live_app.config['JWT_VERIFIER_BACKEND'] = verifier
+        with mock.patch('flask_jwt_consumer.config._Config.decode_keys',
+                        new_callable=PropertyMock) as fake_decode_keys:
+            fake_decode_keys.return_value = [pem(RSA_KEY)] * 3
+            assert _select_key(TOKENS['RS256'][case]) == (MALFORMED, None, None)
+        verifier.verify.assert_not_called()
+
+    def test_other_algorithm_skips_keys(self, live_app):
+        verifier = mock.Mock()
+        live_app.config['JWT_VERIFIER_BACKEND'] = verifier
+        with mock.patch('flask_jwt_consumer.config._Config.decode_keys',
+                        new_callable=PropertyMock) as fake_decode_keys:
+            fake_decode_keys.return_value = [pem(RSA_KEY)] * 3
+            assert _select_key(TOKENS['RS256']['other_alg']) == (MISMATCH, None, None)
+        verifier.verify.assert_not_called()
+
+    def test_brute_force_key_with_backend(self, live_app):
+        live_app.config['JWT_VERIFIER_BACKEND'] = 'cryptography'
+        live_app.config['JWT_ALGORITHM'] = 'ES256'
+        keys = [ssh(P384_KEY), pem(ED25519_KEY), ssh(P256_KEY)]
+        with mock.patch('flask_jwt_consumer.config._Config.decode_keys',
+                        new_callable=PropertyMock) as fake_decode_keys:
+            fake_decode_keys.return_value = keys
+            assert _brute_force_key(TOKENS['ES256']['good']) == keys[2]
+            assert _brute_force_key(TOKENS['ES256']['tampered_signature']) is None
+
+    def test_signature_verified_once(self, live_app):
+        live_app.config['JWT_VERIFIER_BACKEND'] = 'cryptography'
+        live_app.config['VERIFY_AUD'] = False
+        token = sign({'alg': 'RS256'}, {'sub': 'someone', 'exp': 2 ** 40}, RSA_KEY, 'RS256')
+        with mock.patch('flask_jwt_consumer.config._Config.decode_keys',
+                        new_callable=PropertyMock) as fake_decode_keys, \
+                mock.patch('jwt.api_jws.PyJWS._verify_signature') as verify_again:
+            fake_decode_keys.return_value = [ssh(OTHER_RSA_KEY), ssh(RSA_KEY)]
+            result = _select_key(token)
+            assert result.status == MATCH
+            assert _decode_payload(token, result.key, claims=result.claims) == jwt.decode(
+                token, options={'verify_signature': False})
+        verify_again.assert_not_called()
+
+    def test_token_parsed_once(self, live_app):
+        live_app.config['VERIFY_AUD'] = False
+        token = sign({'alg': 'RS256'}, {'sub': 'someone', 'exp': 2 ** 40}, RSA_KEY, 'RS256')
+        with mock.patch('flask_jwt_consumer.config._Config.decode_keys',
+                        new_callable=PropertyMock) as fake_decode_keys, \
+                mock.patch('flask_jwt_consumer.helpers.parse_token',
+                           wraps=parse_token) as parse, \
+                mock.patch('flask_jwt_consumer.tokens.Token.claims',
+                           autospec=True, side_effect=Token.claims) as claims:
+            fake_decode_keys.return_value = [pem(RSA_KEY)]
+            assert _verify_token(token)['sub'] == 'someone'
+        assert parse.call_count == 1
+        assert claims.call_count == 1
+
+    @pytest.mark.parametrize('claims', [
+        {'sub': 'someone'},
+        {'exp': 1},
+        {'exp': 'soon'},
+        {'nbf': 2 ** 40},
+        {'iat': 'then'},
+        {'iat': 2 ** 40},
+        {'aud': 'self-identity'},
+        {'aud': ['other', 'self-identity']},
+        {'aud': 'other'},
+        {'aud': 1},
+        {'sub': 1},
+        {'jti': 1},
+    ])
+    @pytest.mark.parametrize('audience', [None, 'self-identity'])
+    @pytest.mark.parametrize('header', [{'alg': 'RS256'}, {'alg': 'RS256', 'crit': ['exp']}])
+    def test_claims_agree_with_pyjwt(self, live_app, claims, audience, header):
+        live_app.config['JWT_IDENTITY'] = audience
+        token = sign(header, claims, RSA_KEY, 'RS256')
+        try:
+            expected = jwt.decode(token, pem(RSA_KEY), algorithms=['RS256'], audience=audience)
+        except jwt.PyJWTError as error:
+            expected = type(error)
+        try:
+            got = _decode_payload(token, pem(RSA_KEY))
+        except AuthError as error:
+            got = error.content
+        if isinstance(expected, dict):
+            assert got == expected
+        else:
+            assert got == {
+                jwt.ExpiredSignatureError: errors.TOKEN_EXPIRED,
+                jwt.InvalidAudienceError: errors.INVALID_CLAIMS,
+                jwt.InvalidIssuedAtError: errors.INVALID_CLAIMS,
+                jwt.MissingRequiredClaimError: errors.MISSING_CLAIMS,
+            }.get(expected, errors.INVALID_TOKEN)
+
+    def test_unknown_backend(self, live_app):
+        live_app.config['JWT_VERIFIER_BACKEND'] = 'nope'
+        with pytest.raises(RuntimeError):
+            _brute_force_key(TOKENS['RS256']['good'])
@@ -0,0 +1,118 @@
+"""Testing bulk verification command."""
+import io
+import json
+import subprocess
+import sys
+from datetime import datetime, timedelta
+
+import jwt
+import pytest
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+
+from flask_jwt_consumer.cli import main
+
+PRIVATE_KEYS = [rsa.generate_private_key(public_exponent=65537, key_size=2048)
+                for _ in range(3)]
+LATER = datetime.utcnow() + timedelta(days=1)
+EARLIER = datetime.utcnow() - timedelta(days=1)
+SECRET = 'c' * 32 + '-secret-of-service-c'
+
+
+def openssh(key):
+    return key.public_key().public_bytes(serialization.Encoding.OpenSSH,
+                                         serialization.PublicFormat.OpenSSH).decode('utf-8')
+
+
+@pytest.fixture
+def key_files(tmp_path):
+    current = tmp_path / 'current.keys'
+    current.write_text('# rotated in\n{}\n'.format(openssh(PRIVATE_KEYS[0])))
+    historical = tmp_path / 'historical.keys'
+    historical.write_text('{}\n'.format(openssh(PRIVATE_KEYS[1])))
+    hmac_keys = tmp_path / 'hmac.keys'
+    hmac_keys.write_text('service-c {}\n'.format(SECRET))
+    return str(current), str(historical), str(hmac_keys)
+
+
+@pytest.fixture
+def tokens():
+    return [
+        jwt.encode({'sub': 'current', 'exp': LATER}, PRIVATE_KEYS[0], algorithm='RS256'),
+        '',
+        jwt.encode({'sub': 'old', 'exp': EARLIER}, PRIVATE_KEYS[1], algorithm='RS256'),
+        jwt.encode({'sub': 'forged', 'exp': LATER}, PRIVATE_KEYS[2], algorithm='RS256'),
+        'not-a-token',
+        jwt.encode({'sub': 'service', 'exp': LATER}, SECRET, algorithm='HS256',
+                   headers={'kid': 'service-c'}),
+    ]
+
+
+def run(argv, text):
+    stdout = io.StringIO()
+    status = main(argv, stdin=io.StringIO(text), stdout=stdout)
+    return status, [json.loads(line) for line in stdout.getvalue().splitlines()]
+
+
+class TestVerifyCommand:
+    """Test verify command."""
+
+    def check(self, records):
+        assert [record['line'] for record in records] == [1, 3, 4, 5, 6]
+        current, old, forged, junk, service = records
+        assert current['claims']['sub'] == 'current'
+        assert current['key'] == {'set': current['key']['set'], 'index': 1}
+        assert current['key']['set'].endswith('current.keys')
+        assert 'error' not in current
+        assert old['key']['set'].endswith('historical.keys')
+        assert old['error'] == 'token_expired'
+        assert old['claims']['sub'] == 'old'
+        assert forged['error'] == 'Invalid_header.'
+        assert 'key' not in forged
+        assert junk['error'] == 'invalid_header'
+        assert service['key'] == {'kid': 'service-c'}
+        assert service['claims']['sub'] == 'service'
+
+    @pytest.mark.parametrize('workers', ['1', '2'])
+    def test_verify(self, key_files, tokens, workers):
+        current, historical, hmac_keys = key_files
+        status, records = run(['verify', '--keys', current, '--keys', historical,
+                               '--hmac-keys', hmac_keys, '--workers', workers,
+                               '--batch-size', '2'],
+                              '\n'.join(tokens) + '\n')
+        assert status == 1
+        assert all(record['source'] == '-' for record in records)
+        self.check(records)
+
+    def test_files(self, key_files, tokens, tmp_path):
+        current, historical, hmac_keys = key_files
+        path = tmp_path / 'tokens.log'
+        path.write_text('\n'.join(tokens))
+        status, records = run(['verify', '--keys', current, '--keys', historical,
+                               '--hmac-keys', hmac_keys, '--workers', '1', str(path)], '')
+        assert all(record['source'] == str(path) for record in records)
+        self.check(records)
+
+    def test_all_valid(self, key_files, tokens):
+        current, _, _ = key_files
+        status, records = run(['verify', '--keys', current, '--workers', '1'], tokens[0])
+        assert status == 0
+        assert records[0]['claims']['sub'] == 'current'
+
+    def test_hmac_only(self, key_files, tokens):
+        _, _, hmac_keys = key_files
+        status, records = run(['verify', '--hmac-keys', hmac_keys, '--workers', '1'],
+                              '\n'.join([tokens[0], tokens[-1]]))
+        assert records[0]['error'] == 'Invalid_header.'
+        assert records[1]['claims']['sub'] == 'service'
+
+    def test_no_keys(self):
+        with pytest.raises(SystemExit):
+            main(['verify'], stdin=io.StringIO(''), stdout=io.StringIO())
+
+    def test_module(self, key_files, tokens):
+        current, _, _ = key_files
+        completed = subprocess.run(
+            [sys.executable, '-m', 'flask_jwt_consumer', 'verify', '--keys', current],
+            input=tokens[0], stdout=subprocess.PIPE, universal_newlines=True, check=True)
+        assert json.loads(completed.stdout)['claims']['sub'] == 'current'
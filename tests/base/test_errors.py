@@ -0,0 +1,81 @@
+"""Testing AuthError rendering."""
+import json
+
+import pytest
+from flask import Flask
+from webtest import TestApp
+
+from flask_jwt_consumer import AuthError, JWTConsumer, requires_jwt
+from flask_jwt_consumer import errors
+
+
+@pytest.fixture
+def handled_app():
+    """An application with AuthError handler registered."""
+    app = Flask(__name__)
+    app.config['JWT_REGISTER_ERROR_HANDLER'] = True
+    app.config['JWT_AUTHORIZED_KEYS'] = 'ssh-rsa AAAA'
+    JWTConsumer(app)
+
+    @app.route('/protected')
+    @requires_jwt
+    def protected():
+        return 'Yolo'
+
+    @app.route('/limited')
+    def limited():
+        raise AuthError({'code': 'slow_down', 'description': 'Too many.'}, 429,
+                        {'Retry-After': '3'})
+
+    return TestApp(app)
+
+
+class TestErrors:
+    """Test AuthError rendering."""
+
+    def test_common_errors_are_prerendered(self):
+        first = AuthError(errors.TOKEN_EXPIRED, 401).render()
+        second = AuthError(dict(errors.TOKEN_EXPIRED), 401).render()
+        assert first[0] is second[0]
+        assert json.loads(first[0]) == errors.TOKEN_EXPIRED
+
+    def test_missing_header(self, handled_app):
+        response = handled_app.get('/protected', status=401)
+        assert response.content_type == 'application/json'
+        assert response.json == errors.AUTHORIZATION_HEADER_MISSING
+        assert response.headers['WWW-Authenticate'] == 'Bearer'
+
+    def test_invalid_token(self, handled_app):
+        response = handled_app.get('/protected', status=401,
+                                   headers={'Authorization': 'Bearer to.ke.n'})
+        assert response.json == errors.INVALID_TOKEN
+        assert response.headers['WWW-Authenticate'] == (
+            'Bearer error="invalid_token", '
+            'error_description="Unable to parse authentication token."')
+
+    def test_extra_headers(self, handled_app):
+        response = handled_app.get('/limited', status=429)
+        assert response.json == {'code': 'slow_down', 'description': 'Too many.'}
+        assert response.headers['Retry-After'] == '3'
+        assert 'WWW-Authenticate' not in response.headers
+
+    def test_tenant_scheme(self):
+        app = Flask(__name__)
+        app.config['JWT_REGISTER_ERROR_HANDLER'] = True
+        JWTConsumer(app)
+        JWTConsumer(app, name='acme', path_prefixes=['/acme'],
+                    settings={'JWT_HEADER_TYPE': 'JWT', 'JWT_AUTHORIZED_KEYS': 'ssh-rsa AAAA'})
+
+        @app.route('/acme/protected')
+        @requires_jwt
+        def protected():
+            return 'Yolo'
+
+        response = TestApp(app).get('/acme/protected', status=401,
+                                    headers={'Authorization': 'Bearer to.ke.n'})
+        assert response.headers['WWW-Authenticate'].startswith('JWT error="invalid_token"')
+
+    def test_handler_is_optional(self):
+        app = Flask(__name__)
+        JWTConsumer(app)
+        assert AuthError not in app.error_handler_spec[None][None]
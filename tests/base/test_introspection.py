@@ -0,0 +1,276 @@
+"""Testing opaque token introspection."""
+import json
+import threading
+import time
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from socketserver import ThreadingMixIn
+from unittest import mock
+from urllib.parse import parse_qs
+
+import jwt
+import pytest
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+from flask import jsonify
+
+from flask_jwt_consumer import (AuthError, Introspector, JWTMiddleware,
+                                get_jwt_payload, requires_jwt)
+
+PRIVATE_KEY = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+AUTHORIZED_KEY = PRIVATE_KEY.public_key().public_bytes(
+    serialization.Encoding.OpenSSH,
+    serialization.PublicFormat.OpenSSH).decode('utf-8')
+LATER = int((datetime.utcnow() + timedelta(10)).timestamp())
+
+RESPONSES = {
+    'opaque-active': {'active': True, 'sub': 'opaque', 'aud': 'self-identity', 'exp': LATER},
+    'opaque-no-exp': {'active': True, 'sub': 'forever', 'aud': 'self-identity'},
+    'opaque-other-aud': {'active': True, 'sub': 'opaque', 'aud': ['other'], 'exp': LATER},
+    'opaque-inactive': {'active': False},
+}
+
+
+class ThreadingServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    """RFC 7662 endpoint, answers from RESPONSES."""
+
+    protocol_version = 'HTTP/1.1'
+
+    def do_POST(self):
+        server = self.server
+        body = self.rfile.read(int(self.headers['Content-Length']))
+        token = parse_qs(body.decode('utf-8'))['token'][0]
+        with server.lock:
+            server.requests.append((token, self.headers.get('Authorization')))
+        time.sleep(server.delay)
+        if token == 'broken':
+            data, status = b'<html>oops</html>', 500
+        else:
+            data, status = json.dumps(RESPONSES.get(token, {'active': False})).encode(), 200
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def stub_server():
+    server = ThreadingServer(('127.0.0.1', 0), StubHandler)
+    server.requests = []
+    server.lock = threading.Lock()
+    server.delay = 0
+    server.url = 'http://127.0.0.1:{}/introspect'.format(server.server_address[1])
+    thread = threading.Thread(target=server.serve_forever, args=(0.01,), daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def introspection_app(live_testapp, live_app, stub_server):
+    live_app.config['JWT_AUTHORIZED_KEYS'] = AUTHORIZED_KEY
+    live_app.config['JWT_INTROSPECTION_URL'] = stub_server.url
+    live_app.config['JWT_INTROSPECTION_AUTH'] = ('consumer', 's3cret')
+
+    @live_app.route('/opaque')
+    @requires_jwt
+    def opaque():
+        return jsonify(get_jwt_payload())
+
+    return live_testapp
+
+
+def identity(it):
+    """ Echo back what it gets. """
+    return it
+
+
+def bearer(token):
+    return {'Authorization': 'Bearer ' + token}
+
+
+class TestIntrospector:
+    """Test introspection client."""
+
+    def test_cached_until_exp(self, stub_server):
+        now = [1000.0]
+        response = dict(RESPONSES['opaque-active'], exp=1010)
+        RESPONSES['opaque-short'] = response
+        introspector = Introspector(stub_server.url, clock=lambda: now[0])
+        assert introspector.introspect('opaque-short') == response
+        assert introspector.introspect('opaque-short') == response
+        assert len(stub_server.requests) == 1
+        now[0] = 1010
+        introspector.introspect('opaque-short')
+        assert len(stub_server.requests) == 2
+
+    def test_not_cached(self, stub_server):
+        introspector = Introspector(stub_server.url)
+        for token in ('opaque-inactive', 'opaque-inactive', 'opaque-no-exp', 'opaque-no-exp'):
+            introspector.introspect(token)
+        assert len(stub_server.requests) == 4
+        assert len(introspector) == 0
+
+    def test_cache_size(self, stub_server):
+        introspector = Introspector(stub_server.url, cache_size=1)
+        introspector.introspect('opaque-active')
+        introspector.introspect('opaque-other-aud')
+        introspector.introspect('opaque-active')
+        assert len(introspector) == 1
+        assert len(stub_server.requests) == 3
+
+    def test_coalesced(self, stub_server):
+        stub_server.delay = 0.2
+        introspector = Introspector(stub_server.url)
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(
+            introspector.introspect('opaque-no-exp'))) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert len(results) == 8
+        assert all(result['sub'] == 'forever' for result in results)
+        assert len(stub_server.requests) == 1
+
+    def test_coalesced_error(self, stub_server):
+        stub_server.delay = 0.2
+        introspector = Introspector(stub_server.url)
+        errors = []
+
+        def run():
+            try:
+                introspector.introspect('broken')
+            except AuthError as error:
+                errors.append(error.code)
+
+        threads = [threading.Thread(target=run) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert errors == [503] * 4
+        assert len(stub_server.requests) == 1
+
+    def test_coalesced_unexpected_error(self, stub_server):
+        introspector = Introspector(stub_server.url)
+        entered = threading.Event()
+        release = threading.Event()
+
+        def broken(token):
+            entered.set()
+            release.wait()
+            raise RuntimeError('boom')
+
+        results = []
+
+        def leader():
+            try:
+                introspector.introspect('opaque-no-exp')
+            except RuntimeError as error:
+                results.append(str(error))
+
+        def follower():
+            try:
+                introspector.introspect('opaque-no-exp')
+            except AuthError as error:
+                results.append(error.code)
+
+        with mock.patch.object(introspector, '_request', side_effect=broken):
+            first = threading.Thread(target=leader)
+            first.start()
+            entered.wait()
+            second = threading.Thread(target=follower)
+            second.start()
+            time.sleep(0.05)
+            release.set()
+            first.join()
+            second.join()
+        assert sorted(results, key=str) == [503, 'boom']
+
+    def test_connection_reused(self, stub_server):
+        introspector = Introspector(stub_server.url)
+        introspector.introspect('opaque-inactive')
+        connection = introspector._pool.queue[0]
+        introspector.introspect('opaque-inactive')
+        assert introspector._pool.queue == [connection]
+
+    def test_stale_connection(self, stub_server):
+        introspector = Introspector(stub_server.url)
+        introspector.introspect('opaque-inactive')
+        introspector._pool.queue[0].sock.close()
+        assert introspector.introspect('opaque-no-exp')['sub'] == 'forever'
+
+    def test_unreachable(self):
+        introspector = Introspector('http://127.0.0.1:1/introspect', timeout=1)
+        with pytest.raises(AuthError) as error:
+            introspector.introspect('opaque-active')
+        assert error.value.code == 503
+
+    def test_bad_url(self):
+        with pytest.raises(RuntimeError):
+            Introspector('ftp://example.com/introspect')
+
+
+class TestRequiresJwt:
+    """Test introspection fallback of the decorator."""
+
+    def test_opaque(self, introspection_app, stub_server):
+        for _ in range(3):
+            res = introspection_app.get('/opaque', headers=bearer('opaque-active'))
+            assert res.json['sub'] == 'opaque'
+        assert stub_server.requests == [('opaque-active', 'Basic Y29uc3VtZXI6czNjcmV0')]
+
+    def test_jwt_not_introspected(self, introspection_app, stub_server):
+        token = jwt.encode({'sub': 'jwt', 'aud': 'self-identity', 'exp': LATER},
+                           PRIVATE_KEY, algorithm='RS256')
+        res = introspection_app.get('/opaque', headers=bearer(token))
+        assert res.json['sub'] == 'jwt'
+        assert stub_server.requests == []
+
+    @pytest.mark.parametrize('token, status, code', [
+        ('opaque-inactive', 401, 'token_inactive'),
+        ('unknown', 401, 'token_inactive'),
+        ('opaque-other-aud', 401, 'invalid_claims'),
+        ('broken', 503, 'introspection_unavailable'),
+    ])
+    def test_rejected(self, introspection_app, token, status, code):
+        with mock.patch('flask_jwt_consumer.decorators.get_jwt_raw', return_value=token):
+            with pytest.raises(AuthError) as error:
+                requires_jwt(identity)('De nada')
+        assert error.value.code == status
+        assert error.value.content['code'] == code
+
+    def test_off(self, live_app, stub_server):
+        live_app.config['JWT_AUTHORIZED_KEYS'] = AUTHORIZED_KEY
+        with mock.patch('flask_jwt_consumer.decorators.get_jwt_raw',
+                        return_value='opaque-active'):
+            with pytest.raises(AuthError) as error:
+                requires_jwt(identity)('De nada')
+        assert error.value.content['code'] == 'invalid_header'
+        assert stub_server.requests == []
+
+
+class TestMiddleware:
+    """Test introspection fallback of the middleware."""
+
+    def test_opaque(self, stub_server):
+        def app(environ, start_response):
+            start_response('200 OK', [('Content-Type', 'text/plain')])
+            return [environ['flask_jwt_consumer.payload']['sub'].encode('utf-8')]
+
+        middleware = JWTMiddleware(app, {'JWT_AUTHORIZED_KEYS': AUTHORIZED_KEY,
+                                         'JWT_INTROSPECTION_URL': stub_server.url})
+        assert middleware.verify({'HTTP_AUTHORIZATION': 'Bearer opaque-active'})['sub'] == 'opaque'
+        with pytest.raises(AuthError) as error:
+            middleware.verify({'HTTP_AUTHORIZATION': 'Bearer opaque-inactive'})
+        assert error.value.content['code'] == 'token_inactive'
@@ -0,0 +1,125 @@
+"""Testing HMAC keyring."""
+import hashlib
+import hmac
+from datetime import datetime, timedelta
+from unittest import mock
+
+import jwt
+import pytest
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+from jwt.utils import base64url_encode
+
+from flask_jwt_consumer import (AuthError, HMACKeyring, get_jwt_payload,
+                                requires_jwt)
+from flask_jwt_consumer.helpers import MATCH, MISMATCH, _select_key
+
+SECRETS = {
+    'service-a': 'a' * 32 + '-secret-of-service-a',
+    'service-b': 'b' * 32 + '-secret-of-service-b',
+}
+PRIVATE_KEY = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+PUBLIC_PEM = PRIVATE_KEY.public_key().public_bytes(
+    serialization.Encoding.PEM,
+    serialization.PublicFormat.SubjectPublicKeyInfo)
+PAYLOAD = {'sub': 'service-b', 'exp': int((datetime.utcnow() + timedelta(10)).timestamp())}
+
+
+def identity(it):
+    """ Echo back what it gets. """
+    return it
+
+
+def hs_token(kid='service-b', secret=None, algorithm='HS256'):
+    headers = {'kid': kid} if kid else None
+    return jwt.encode(PAYLOAD, secret or SECRETS[kid or 'service-b'],
+                      algorithm=algorithm, headers=headers)
+
+
+@pytest.fixture
+def hmac_app(live_app):
+    live_app.config['JWT_HMAC_KEYS'] = SECRETS
+    return live_app
+
+
+class TestKeyring:
+    """Test HMAC keyring."""
+
+    def test_parse(self):
+        text = '# internal services\n\nservice-a  one secret\nservice-b two\n'
+        assert HMACKeyring.parse(text) == {'service-a': 'one secret', 'service-b': 'two'}
+
+    def test_parse_no_secret(self):
+        with pytest.raises(RuntimeError):
+            HMACKeyring.parse('service-a\n')
+
+    def test_unknown_algorithm(self):
+        with pytest.raises(RuntimeError):
+            HMACKeyring(SECRETS, ['HS256', 'RS256'])
+
+    def test_select_by_kid(self, hmac_app):
+        result = _select_key(hs_token())
+        assert result.status == MATCH
+        assert result.key.kid == 'service-b'
+
+    def test_select_without_kid(self, hmac_app):
+        result = _select_key(hs_token(kid=None))
+        assert result.status == MATCH
+        assert result.key.kid == 'service-b'
+
+    def test_unknown_kid(self, hmac_app):
+        token = hs_token(kid='service-c', secret=SECRETS['service-a'])
+        assert _select_key(token) == (MISMATCH, None, None)
+
+    def test_algorithm_not_allowed(self, hmac_app):
+        hmac_app.config['JWT_AUTHORIZED_KEYS'] = PUBLIC_PEM.decode('utf-8')
+        assert _select_key(hs_token(algorithm='HS512')) == (MISMATCH, None, None)
+
+    def test_public_key_as_secret_is_refused(self, hmac_app):
+        hmac_app.config['JWT_AUTHORIZED_KEYS'] = PUBLIC_PEM.decode('utf-8')
+        # PyJWT would not sign it, the attacker would
+        signing_input = (base64url_encode(b'{"alg":"HS256","kid":"service-a"}') + b'.'
+                         + base64url_encode(b'{"sub":"admin"}'))
+        signature = hmac.new(PUBLIC_PEM, signing_input, hashlib.sha256).digest()
+        token = (signing_input + b'.' + base64url_encode(signature)).decode('utf-8')
+        assert _select_key(token) == (MISMATCH, None, None)
+
+    def test_secrets_from_file(self, live_app, tmp_path):
+        path = tmp_path / 'hmac_keys'
+        path.write_text('service-b {}\n'.format(SECRETS['service-b']))
+        live_app.config['JWT_HMAC_KEYS_FILE'] = str(path)
+        assert _select_key(hs_token()).status == MATCH
+
+    def test_keyring_is_cached(self, hmac_app):
+        from flask_jwt_consumer.config import config
+        assert config.hmac_keyring is config.hmac_keyring
+        hmac_app.config['JWT_HMAC_KEYS'] = {'service-b': SECRETS['service-b']}
+        assert len(config.hmac_keyring) == 1
+
+    def test_keyring_follows_new_mapping(self, hmac_app):
+        from flask_jwt_consumer.config import config
+        hmac_app.config['JWT_HMAC_KEYS'] = dict(SECRETS)
+        assert _select_key(hs_token()).status == MATCH
+        keyring = config.hmac_keyring
+        rotated = dict(SECRETS, **{'service-b': 'rotated-' + SECRETS['service-b']})
+        hmac_app.config['JWT_HMAC_KEYS'] = rotated
+        assert config.hmac_keyring is not keyring
+        assert _select_key(hs_token()) == (MISMATCH, None, None)
+        assert _select_key(hs_token(secret=rotated['service-b'])).status == MATCH
+
+    def test_requires_jwt(self, hmac_app):
+        with mock.patch('flask_jwt_consumer.decorators.get_jwt_raw',
+                        return_value=hs_token()):
+            protected = requires_jwt(identity)
+            assert protected('De nada') == 'De nada'
+            assert get_jwt_payload() == PAYLOAD
+
+    def test_requires_jwt_bad_signature(self, hmac_app):
+        token = hs_token(secret=SECRETS['service-a'])
+        with mock.patch('flask_jwt_consumer.decorators.get_jwt_raw',
+                        return_value=token):
+            protected = requires_jwt(identity)
+            with pytest.raises(AuthError) as err:
+                protected('De nada')
+
+            assert err.value.content['description'] == 'Unable to find appropriate key.'
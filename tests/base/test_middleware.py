@@ -0,0 +1,126 @@
+"""Testing WSGI middleware."""
+from datetime import datetime, timedelta
+
+import jwt
+import pytest
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+from flask import Flask, jsonify, request
+from webtest import TestApp
+
+from flask_jwt_consumer import (JWTConsumer, JWTMiddleware, errors,
+                                get_jwt_payload, requires_jwt)
+
+PRIVATE_KEY = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+AUTHORIZED_KEY = PRIVATE_KEY.public_key().public_bytes(
+    serialization.Encoding.OpenSSH,
+    serialization.PublicFormat.OpenSSH).decode('utf-8')
+OTHER_KEY = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+
+PAYLOAD = {'sub': 'someone', 'exp': int((datetime.utcnow() + timedelta(10)).timestamp())}
+GOOD_TOKEN = jwt.encode(PAYLOAD, PRIVATE_KEY, algorithm='RS256')
+FORGED_TOKEN = jwt.encode(PAYLOAD, OTHER_KEY, algorithm='RS256')
+EXPIRED_TOKEN = jwt.encode({'exp': datetime.utcnow() - timedelta(10)},
+                           PRIVATE_KEY, algorithm='RS256')
+
+
+def plain_app(environ, start_response):
+    """Not a flask app at all."""
+    start_response('200 OK', [('Content-Type', 'text/plain')])
+    payload = environ.get('flask_jwt_consumer.payload', {'sub': 'anonymous'})
+    return [payload['sub'].encode('utf-8')]
+
+
+@pytest.fixture
+def plain_testapp():
+    settings = {'JWT_AUTHORIZED_KEYS': AUTHORIZED_KEY}
+    return TestApp(JWTMiddleware(plain_app, settings, exempt=['/health']))
+
+
+@pytest.fixture
+def flask_testapp():
+    app = Flask(__name__)
+    app.config['JWT_AUTHORIZED_KEYS'] = AUTHORIZED_KEY
+    JWTConsumer(app)
+    app.wsgi_app = JWTMiddleware(app.wsgi_app, app.config)
+
+    @app.before_request
+    def never_for_rejected():
+        assert 'flask_jwt_consumer.payload' in request.environ
+
+    @app.route('/payload')
+    def payload():
+        return jsonify(get_jwt_payload())
+
+    @app.route('/protected')
+    @requires_jwt
+    def protected():
+        return 'Yolo'
+
+    return TestApp(app)
+
+
+def bearer(token):
+    return {'Authorization': 'Bearer ' + token}
+
+
+class TestMiddleware:
+    """Test JWTMiddleware."""
+
+    def test_plain_app_gets_claims(self, plain_testapp):
+        response = plain_testapp.get('/', headers=bearer(GOOD_TOKEN))
+        assert response.text == 'someone'
+
+    def test_plain_app_exempt(self, plain_testapp):
+        assert plain_testapp.get('/health/live').text == 'anonymous'
+        assert plain_testapp.get('/health').text == 'anonymous'
+
+    @pytest.mark.parametrize('path', ['/health-admin/users', '/healthz', '/api/health'])
+    def test_exempt_by_segments(self, plain_testapp, path):
+        plain_testapp.get(path, status=401)
+
+    @pytest.mark.parametrize('headers,error', [
+        ({}, errors.AUTHORIZATION_HEADER_MISSING),
+        (bearer(FORGED_TOKEN), errors.NO_KEY),
+        (bearer(EXPIRED_TOKEN), errors.TOKEN_EXPIRED),
+        (bearer('not-a-token'), errors.INVALID_TOKEN),
+    ])
+    def test_plain_app_rejected(self, plain_testapp, headers, error):
+        response = plain_testapp.get('/', headers=headers, status=401)
+        assert response.json == error
+        assert response.headers['WWW-Authenticate'].startswith('Bearer')
+
+    def test_cookie(self):
+        settings = {'JWT_AUTHORIZED_KEYS': AUTHORIZED_KEY,
+                    'JWT_USE_COOKIE': True, 'JWT_COOKIE_NAME': 'jwt'}
+        testapp = TestApp(JWTMiddleware(plain_app, settings))
+        testapp.set_cookie('jwt', GOOD_TOKEN)
+        assert testapp.get('/').text == 'someone'
+
+    def test_flask_payload(self, flask_testapp):
+        response = flask_testapp.get('/payload', headers=bearer(GOOD_TOKEN))
+        assert response.json == PAYLOAD
+
+    def test_flask_requires_jwt(self, flask_testapp):
+        assert flask_testapp.get('/protected', headers=bearer(GOOD_TOKEN)).text == 'Yolo'
+
+    def test_flask_rejected_before_dispatch(self, flask_testapp):
+        response = flask_testapp.get('/protected', headers=bearer(FORGED_TOKEN), status=401)
+        assert response.json == errors.NO_KEY
+
+    @pytest.mark.parametrize('token', [FORGED_TOKEN, EXPIRED_TOKEN, 'to.ke.n', 'not-a-token'])
+    def test_same_errors_as_requires_jwt(self, plain_testapp, token):
+        app = Flask(__name__)
+        app.config['JWT_AUTHORIZED_KEYS'] = AUTHORIZED_KEY
+        app.config['JWT_REGISTER_ERROR_HANDLER'] = True
+        JWTConsumer(app)
+
+        @app.route('/')
+        @requires_jwt
+        def protected():
+            return 'Yolo'
+
+        by_middleware = plain_testapp.get('/', headers=bearer(token), status=401)
+        by_decorator = TestApp(app).get('/', headers=bearer(token), status=401)
+        assert by_decorator.json == by_middleware.json
+        assert by_decorator.headers['WWW-Authenticate'] == by_middleware.headers['WWW-Authenticate']
@@ -0,0 +1,183 @@
+"""Testing per subject rate limiting."""
+from unittest import mock
+
+import pytest
+from flask import Flask
+
+from flask_jwt_consumer import (AuthError, JWTConsumer, MemoryRateLimitBackend,
+                                RateLimitBackend, RateLimiter, requires_jwt)
+
+
+def identity(it):
+    """ Echo back what it gets. """
+    return it
+
+
+class Clock:
+    def __init__(self):
+        self.now = 100.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock():
+    return Clock()
+
+
+class TestMemoryBackend:
+    """Test in process token buckets."""
+
+    def test_burst_then_rate(self, clock):
+        backend = MemoryRateLimitBackend(clock=clock)
+        assert [backend.consume('a', 2, 3) for _ in range(3)] == [0, 0, 0]
+        assert backend.consume('a', 2, 3) == pytest.approx(0.5)
+        clock.now += 0.5
+        assert backend.consume('a', 2, 3) == 0
+        assert backend.consume('a', 2, 3) > 0
+
+    def test_refill_capped(self, clock):
+        backend = MemoryRateLimitBackend(clock=clock)
+        backend.consume('a', 1, 2)
+        clock.now += 3600
+        assert [backend.consume('a', 1, 2) for _ in range(3)][-1] > 0
+
+    def test_subjects_apart(self, clock):
+        backend = MemoryRateLimitBackend(clock=clock)
+        assert backend.consume('a', 1, 1) == 0
+        assert backend.consume('a', 1, 1) > 0
+        assert backend.consume('b', 1, 1) == 0
+
+    def test_lru_bounded(self, clock):
+        backend = MemoryRateLimitBackend(max_size=2, clock=clock)
+        backend.consume('a', 1, 1)
+        backend.consume('b', 1, 1)
+        backend.consume('a', 1, 1)
+        backend.consume('c', 1, 1)
+        assert len(backend) == 2
+        # b was the least recently used one, and comes back with full bucket
+        assert backend.consume('b', 1, 1) == 0
+        assert backend.consume('c', 1, 1) > 0
+
+
+class TestRateLimiter:
+    """Test rate limiter."""
+
+    def test_retry_after(self, clock):
+        limiter = RateLimiter('sub', 0.25, 1, MemoryRateLimitBackend(clock=clock))
+        limiter.check({'sub': 'someone'})
+        with pytest.raises(AuthError) as error:
+            limiter.check({'sub': 'someone'})
+        assert error.value.code == 429
+        assert error.value.content['code'] == 'rate_limited'
+        assert error.value.headers == {'Retry-After': '4'}
+        body, headers = error.value.render()
+        assert headers == (('Retry-After', '4'),)
+
+    def test_missing_claim_shared(self, clock):
+        limiter = RateLimiter('client_id', 1, 1, MemoryRateLimitBackend(clock=clock))
+        limiter.check({'sub': 'one'})
+        with pytest.raises(AuthError):
+            limiter.check({'sub': 'two'})
+
+    def test_bad_rate(self):
+        with pytest.raises(RuntimeError):
+            RateLimiter('sub', 0, 1)
+
+    def test_custom_backend(self):
+        class Shared(RateLimitBackend):
+            def __init__(self):
+                self.calls = []
+
+            def consume(self, key, rate, burst):
+                self.calls.append((key, rate, burst))
+                return 0
+
+        backend = Shared()
+        RateLimiter('iss', 5, 10, backend).check({'iss': 'tenant'})
+        assert backend.calls == [('tenant', 5, 10)]
+
+
+class TestRequiresJwt:
+    """Test rate limit stage of the decorator."""
+
+    def test_off_by_default(self, live_app):
+        payload = {'sub': 'someone'}
+        with mock.patch('flask_jwt_consumer.decorators._verify_token',
+                        return_value=payload), \
+                mock.patch('flask_jwt_consumer.decorators.get_jwt_raw',
+                           return_value='token'):
+            protected = requires_jwt(identity)
+            for _ in range(50):
+                assert protected('De nada') == 'De nada'
+
+    def test_limited_before_view(self, live_app):
+        live_app.config['JWT_RATE_LIMIT_CLAIM'] = 'sub'
+        live_app.config['JWT_RATE_LIMIT_RATE'] = 0.001
+        live_app.config['JWT_RATE_LIMIT_BURST'] = 2
+        view = mock.Mock(return_value='ok')
+        protected = requires_jwt(view)
+        with                mock.patch('flask_jwt_consumer.decorators.get_jwt_raw',
+                           return_value='token'):
+            with mock.patch('flask_jwt_consumer.decorators._verify_token',
+                            return_value={'sub': 'abusive'}):
+                assert protected() == 'ok'
+                assert protected() == 'ok'
+                with pytest.raises(AuthError) as error:
+                    protected()
+                assert error.value.code == 429
+                assert int(error.value.headers['Retry-After']) > 900
+            with mock.patch('flask_jwt_consumer.decorators._verify_token',
+                            return_value={'sub': 'polite'}):
+                assert protected() == 'ok'
+        assert view.call_count == 3
+
+    def test_apps_keep_own_limiter(self):
+        apps = []
+        for burst in (2, 3):
+            app = Flask(__name__)
+            app.config['JWT_RATE_LIMIT_CLAIM'] = 'sub'
+            app.config['JWT_RATE_LIMIT_RATE'] = 0.001
+            app.config['JWT_RATE_LIMIT_BURST'] = burst
+            JWTConsumer(app)
+            apps.append(app)
+        protected = requires_jwt(mock.Mock(return_value='ok'))
+        passed = [0, 0]
+        with mock.patch('flask_jwt_consumer.decorators.get_jwt_raw',
+                        return_value='token'), \
+                mock.patch('flask_jwt_consumer.decorators._verify_token',
+                           return_value={'sub': 'someone'}):
+            # Calls alternate between the apps, as under one dispatcher
+            for _ in range(5):
+                for index, app in enumerate(apps):
+                    with app.test_request_context():
+                        try:
+                            protected()
+                            passed[index] += 1
+                        except AuthError:
+                            pass
+        assert passed == [2, 3]
+
+    def test_rendered_by_handler(self, live_app):
+        from flask_jwt_consumer.errors import handle_auth_error
+
+        live_app.config['JWT_RATE_LIMIT_CLAIM'] = 'sub'
+        live_app.config['JWT_RATE_LIMIT_BURST'] = 1
+        live_app.register_error_handler(AuthError, handle_auth_error)
+
+        @live_app.route('/limited')
+        @requires_jwt
+        def limited():
+            return 'ok'
+
+        client = live_app.test_client()
+        with mock.patch('flask_jwt_consumer.decorators.get_jwt_raw',
+                        return_value='token'), \
+                mock.patch('flask_jwt_consumer.decorators._verify_token',
+                           return_value={'sub': 'burst-of-one'}):
+            assert client.get('/limited').status_code == 200
+            response = client.get('/limited')
+        assert response.status_code == 429
+        assert response.headers['Retry-After'] == '1'
+        assert response.json['code'] == 'rate_limited'
@@ -0,0 +1,208 @@
+"""Testing token revocation."""
+import io
+import threading
+import time
+from datetime import datetime, timedelta
+from unittest import mock
+
+import jwt
+import pytest
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+
+from flask_jwt_consumer import (AuthError, BloomFilter, BloomRevocationStore,
+                                MemoryRevocationStore, requires_jwt)
+from flask_jwt_consumer.helpers import MATCH, KeyResult
+
+PRIVATE_KEY = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+PUBLIC_KEY = PRIVATE_KEY.public_key().public_bytes(
+    serialization.Encoding.PEM,
+    serialization.PublicFormat.SubjectPublicKeyInfo)
+
+
+def identity(it):
+    """ Echo back what it gets. """
+    return it
+
+
+def make_token(**claims):
+    claims.setdefault('exp', datetime.utcnow() + timedelta(10))
+    return jwt.encode(claims, PRIVATE_KEY, algorithm='RS256')
+
+
+class FakeClock:
+    """Clock to move by hand."""
+
+    def __init__(self, now=1000):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+class TestRevocation:
+    """Test revocation stores."""
+
+    def test_bloom_filter_contains(self):
+        bloom = BloomFilter.for_capacity(100)
+        for i in range(100):
+            bloom.add('jti-{}'.format(i))
+
+        assert all('jti-{}'.format(i) in bloom for i in range(100))
+        misses = sum('other-{}'.format(i) in bloom for i in range(1000))
+        assert misses < 20
+
+    def test_bloom_filter_dump_load(self):
+        bloom = BloomFilter.for_capacity(10)
+        bloom.add('revoked')
+        stream = io.BytesIO()
+        bloom.dump(stream)
+        stream.seek(0)
+
+        loaded = BloomFilter.load(stream)
+        assert (loaded.num_bits, loaded.num_hashes) == (bloom.num_bits, bloom.num_hashes)
+        assert 'revoked' in loaded
+
+    def test_bloom_filter_load_garbage(self):
+        with pytest.raises(ValueError):
+            BloomFilter.load(io.BytesIO(b'nope, not a filter'))
+
+    def test_memory_store_evicts_expired(self):
+        clock = FakeClock()
+        store = MemoryRevocationStore(clock=clock)
+        store.revoke('short', exp=1010)
+        store.revoke('long', exp=2000)
+        store.revoke('forever')
+        assert store.is_revoked('short')
+
+        clock.now = 1500
+        assert not store.is_revoked('short')
+        assert store.is_revoked('long')
+        assert store.is_revoked('forever')
+        assert len(store) == 2
+
+    def test_memory_store_revoke_again_extends(self):
+        clock = FakeClock()
+        store = MemoryRevocationStore(clock=clock)
+        store.revoke('jti', exp=1010)
+        store.revoke('jti', exp=2000)
+
+        clock.now = 1500
+        assert store.is_revoked('jti')
+
+    def test_bloom_store_skips_backing_store(self):
+        backing = mock.Mock()
+        store = BloomRevocationStore(backing, BloomFilter.for_capacity(10))
+        store.revoke('revoked', 1010)
+
+        backing.is_revoked.return_value = True
+        assert store.is_revoked('revoked')
+        assert not store.is_revoked('fine')
+        backing.is_revoked.assert_called_once_with('revoked')
+
+    def test_bloom_store_reload_keeps_known(self):
+        store = BloomRevocationStore(bloom=BloomFilter.for_capacity(10))
+        store.revoke('runtime', 2 ** 40)
+        dumped = BloomRevocationStore(bloom=BloomFilter.for_capacity(10))
+        dumped.revoke('from-file', 2 ** 40)
+        stream = io.BytesIO()
+        dumped.dump(stream)
+        stream.seek(0)
+
+        store.reload(stream)
+        assert store.bloom is not dumped.bloom
+        assert 'from-file' in store.bloom
+        assert store.is_revoked('from-file')
+        assert store.is_revoked('runtime')
+
+    def test_bloom_store_survives_restart(self, tmp_path):
+        path = str(tmp_path / 'revoked.bloom')
+        before = BloomRevocationStore(bloom=BloomFilter.for_capacity(10))
+        before.revoke('stolen', 2 ** 40)
+        before.revoke('expired', 1)
+        with open(path, 'wb') as stream:
+            before.dump(stream)
+
+        after = BloomRevocationStore.from_file(path)
+        assert after.is_revoked('stolen')
+        assert not after.is_revoked('expired')
+        assert not after.is_revoked('fine')
+
+    def test_bloom_store_dump_without_filter(self):
+        store = BloomRevocationStore()
+        store.revoke('stolen')
+        stream = io.BytesIO()
+        store.dump(stream)
+        stream.seek(0)
+        assert BloomRevocationStore.load(stream).is_revoked('stolen')
+
+    def test_bloom_store_revoke_during_reload(self):
+        revoking = []
+
+        class SlowStore(MemoryRevocationStore):
+            """Revokes from another thread while the filter is being filled."""
+
+            def __iter__(self):
+                entries = super().__iter__()
+                thread = threading.Thread(target=store.revoke, args=('late', 2 ** 40))
+                thread.start()
+                revoking.append(thread)
+                time.sleep(0.05)
+                return entries
+
+        store = BloomRevocationStore(SlowStore(), BloomFilter.for_capacity(10))
+        store.reload(BloomFilter.for_capacity(10))
+        revoking[0].join()
+        assert 'late' in store.bloom
+        assert store.is_revoked('late')
+
+    def test_memory_store_evicts_concurrently(self):
+        clock = FakeClock()
+        store = MemoryRevocationStore(clock=clock)
+        errors = []
+
+        def check():
+            try:
+                for _ in range(2000):
+                    store.is_revoked('any')
+            except IndexError as error:
+                errors.append(error)
+
+        for i in range(2000):
+            store.revoke('jti-{}'.format(i), 1000 + i)
+        clock.now = 5000
+        threads = [threading.Thread(target=check) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert errors == []
+        assert len(store) == 0
+
+    def test_requires_jwt_rejects_revoked(self, live_testapp_no_identity, live_app):
+        store = MemoryRevocationStore()
+        store.revoke('stolen', 2 ** 40)
+        live_app.config['JWT_REVOCATION_STORE'] = store
+        with mock.patch('flask_jwt_consumer.decorators.get_jwt_raw',
+                        return_value=make_token(jti='stolen')):
+            with mock.patch('flask_jwt_consumer.helpers._select_key',
+                            return_value=KeyResult(MATCH, PUBLIC_KEY)):
+                protected = requires_jwt(identity)
+                with pytest.raises(AuthError) as err:
+                    protected('De nada')
+
+                assert err.value.code == 401
+                assert err.value.content == {'code': 'token_revoked',
+                                             'description': 'Token has been revoked.'}
+
+    def test_requires_jwt_passes_not_revoked(self, live_testapp_no_identity, live_app):
+        store = MemoryRevocationStore()
+        store.revoke('stolen', 2 ** 40)
+        live_app.config['JWT_REVOCATION_STORE'] = store
+        for token in (make_token(jti='fine'), make_token()):
+            with mock.patch('flask_jwt_consumer.decorators.get_jwt_raw',
+                            return_value=token):
+                with mock.patch('flask_jwt_consumer.helpers._select_key',
+                                return_value=KeyResult(MATCH, PUBLIC_KEY)):
+                    protected = requires_jwt(identity)
+                    assert protected('De nada') == 'De nada'
@@ -0,0 +1,148 @@
+"""Testing verification stats."""
+from datetime import datetime, timedelta
+from unittest import mock
+
+import jwt
+import pytest
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+from flask import Flask
+from webtest import TestApp
+
+from flask_jwt_consumer import (AuthError, JWTConsumer, JWTMiddleware,
+                                requires_jwt)
+from flask_jwt_consumer.config import config
+
+PRIVATE_KEYS = [rsa.generate_private_key(public_exponent=65537, key_size=2048)
+                for _ in range(3)]
+AUTHORIZED_KEYS = '\n'.join(
+    '{} key-{}'.format(key.public_key().public_bytes(
+        serialization.Encoding.OpenSSH,
+        serialization.PublicFormat.OpenSSH).decode('utf-8'), index)
+    for index, key in enumerate(PRIVATE_KEYS))
+STRANGER = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+LATER = datetime.utcnow() + timedelta(days=1)
+SECRET = 'd' * 32 + '-secret-of-service-d'
+
+
+def token(key, **claims):
+    return jwt.encode(dict({'sub': 'someone', 'exp': LATER}, **claims), key, algorithm='RS256')
+
+
+def identity(it):
+    """ Echo back what it gets. """
+    return it
+
+
+@pytest.fixture
+def stats_app(live_app):
+    live_app.config['JWT_AUTHORIZED_KEYS'] = AUTHORIZED_KEYS
+    config.stats.reset()
+    yield live_app
+    config.stats.reset()
+
+
+def call(raw):
+    with mock.patch('flask_jwt_consumer.decorators.get_jwt_raw', return_value=raw):
+        try:
+            return requires_jwt(identity)('De nada')
+        except AuthError as error:
+            return error
+
+
+class TestSnapshot:
+    """Test stats snapshot."""
+
+    def test_keys(self, stats_app):
+        call(token(PRIVATE_KEYS[0]))
+        call(token(PRIVATE_KEYS[2]))
+        call(token(PRIVATE_KEYS[2]))
+        call(token(STRANGER))
+        snapshot = stats_app.extensions['flask-jwt-management'].snapshot()
+        assert [key['comment'] for key in snapshot['keys']] == ['key-0', 'key-1', 'key-2']
+        assert [key['matches'] for key in snapshot['keys']] == [1, 0, 2]
+        assert len({key['fingerprint'] for key in snapshot['keys']}) == 3
+        assert snapshot['lookups'] == 4
+        assert snapshot['keys_tried'] == 1 + 3 + 3 + 3
+        assert snapshot['average_keys_tried'] == 2.5
+        assert snapshot['failures'] == {'Invalid_header.': 1}
+
+    def test_retired_keys(self, stats_app):
+        call(token(PRIVATE_KEYS[2]))
+        stats_app.config['JWT_AUTHORIZED_KEYS'] = AUTHORIZED_KEYS.splitlines()[0]
+        snapshot = config.stats.snapshot(config)
+        assert [key['matches'] for key in snapshot['keys']] == [0]
+        assert snapshot['retired_key_matches'] == 1
+
+    def test_failures(self, stats_app):
+        call(token(PRIVATE_KEYS[0], exp=datetime.utcnow() - timedelta(days=1)))
+        call(token(PRIVATE_KEYS[0], exp=datetime.utcnow() - timedelta(days=1)))
+        call('not-a-token')
+        assert config.stats.snapshot(config)['failures'] == {
+            'token_expired': 2, 'invalid_header': 1}
+
+    def test_hmac(self, stats_app):
+        stats_app.config['JWT_HMAC_KEYS'] = {'service-d': SECRET}
+        call(jwt.encode({'sub': 'service'}, SECRET, algorithm='HS256',
+                        headers={'kid': 'service-d'}))
+        assert config.stats.snapshot(config)['hmac_keys'] == {'service-d': 1}
+
+    def test_caches(self, stats_app):
+        stats_app.config['JWT_VERIFIER_BACKEND'] = 'cryptography'
+        stats_app.config['JWT_RATE_LIMIT_CLAIM'] = 'sub'
+        for _ in range(3):
+            call(token(PRIVATE_KEYS[0]))
+        caches = config.stats.snapshot(config)['caches']
+        assert set(caches) == {'headers', 'rendered_errors', 'verifier', 'rate_limit'}
+        assert caches['verifier']['hits'] >= 2
+        assert 0 < caches['verifier']['hit_rate'] <= 1
+        assert caches['headers']['max_size'] == 128
+        assert caches['rate_limit'] == {'size': 1}
+
+    def test_middleware(self):
+        def app(environ, start_response):
+            start_response('200 OK', [])
+            return [b'ok']
+
+        middleware = JWTMiddleware(app, {'JWT_AUTHORIZED_KEYS': AUTHORIZED_KEYS})
+        testapp = TestApp(middleware)
+        testapp.get('/', headers={'Authorization': 'Bearer ' + token(PRIVATE_KEYS[1])})
+        testapp.get('/', status=401)
+        stats = middleware.config.stats
+        assert stats.lookups == 1
+        assert stats.keys_tried == 2
+        assert dict(stats.failures) == {'authorization_header_missing': 1}
+
+
+class TestEndpoint:
+    """Test stats endpoint."""
+
+    @pytest.fixture
+    def endpoint_app(self):
+        app = Flask(__name__)
+        app.config['JWT_AUTHORIZED_KEYS'] = AUTHORIZED_KEYS
+        app.config['JWT_STATS_ENDPOINT'] = '/_jwt/stats'
+        app.config['JWT_STATS_SCOPE'] = 'jwt:stats'
+        app.config['JWT_REGISTER_ERROR_HANDLER'] = True
+        JWTConsumer(app)
+        return TestApp(app)
+
+    def test_served(self, endpoint_app):
+        headers = {'Authorization': 'Bearer ' + token(PRIVATE_KEYS[0], scope='read jwt:stats')}
+        res = endpoint_app.get('/_jwt/stats', headers=headers)
+        assert res.json['keys'][0]['matches'] >= 1
+        assert 'caches' in res.json
+
+    def test_scope(self, endpoint_app):
+        headers = {'Authorization': 'Bearer ' + token(PRIVATE_KEYS[0], scope='read')}
+        res = endpoint_app.get('/_jwt/stats', headers=headers, status=403)
+        assert res.json['code'] == 'insufficient_scope'
+        assert res.headers['WWW-Authenticate'] == (
+            'Bearer error="insufficient_scope", '
+            'error_description="Token does not have the scope required."')
+
+    def test_no_token(self, endpoint_app):
+        endpoint_app.get('/_jwt/stats', status=401)
+
+    def test_off_by_default(self, live_app):
+        assert 'flask_jwt_consumer_stats' not in live_app.view_functions
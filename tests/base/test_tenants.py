@@ -0,0 +1,248 @@
+"""Testing named consumer instances of one app."""
+from datetime import datetime, timedelta
+
+import jwt
+import pytest
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+from flask import Flask, jsonify
+from webtest import TestApp
+
+from flask_jwt_consumer import (JWTConsumer, JWTMiddleware, get_jwt_payload, requires_jwt,
+                                selector_of)
+from flask_jwt_consumer.tenants import TenantSelector
+
+KEYS = {name: rsa.generate_private_key(public_exponent=65537, key_size=2048)
+        for name in ('default', 'acme', 'globex')}
+LATER = datetime.utcnow() + timedelta(days=1)
+
+
+def authorized(name):
+    return KEYS[name].public_key().public_bytes(
+        serialization.Encoding.OpenSSH,
+        serialization.PublicFormat.OpenSSH).decode('utf-8')
+
+
+def bearer(name, aud):
+    token = jwt.encode({'sub': name, 'aud': aud, 'exp': LATER}, KEYS[name], algorithm='RS256')
+    return {'Authorization': 'Bearer ' + token}
+
+
+class Named:
+    def __init__(self, name):
+        self.name = name
+
+
+@pytest.fixture
+def tenants():
+    app = Flask(__name__)
+    app.config['JWT_AUTHORIZED_KEYS'] = authorized('default')
+    app.config['JWT_IDENTITY'] = 'default-api'
+    app.config['JWT_REGISTER_ERROR_HANDLER'] = True
+    consumers = {
+        None: JWTConsumer(app),
+        'acme': JWTConsumer(app, name='acme', hosts=['acme.example.com'],
+                            settings={'JWT_AUTHORIZED_KEYS': authorized('acme'),
+                                      'JWT_IDENTITY': 'acme-api'}),
+        'globex': JWTConsumer(app, name='globex', path_prefixes=['/globex'],
+                              settings={'JWT_AUTHORIZED_KEYS': authorized('globex'),
+                                        'JWT_IDENTITY': 'globex-api',
+                                        'JWT_VERIFIER_BACKEND': 'cryptography'}),
+    }
+
+    @app.route('/whoami')
+    @app.route('/globex/whoami')
+    @requires_jwt
+    def whoami():
+        return jsonify(get_jwt_payload())
+
+    return TestApp(app), consumers
+
+
+class TestSelector:
+    """Test tenant selection."""
+
+    def test_host(self):
+        selector = TenantSelector()
+        acme = Named('acme')
+        selector.add(acme, hosts=['Acme.example.com'])
+        assert selector.select('acme.example.com', '/') is acme
+        assert selector.select('ACME.example.com:8080', '/') is acme
+        assert selector.select('other.example.com', '/') is None
+
+    def test_longest_prefix(self):
+        selector = TenantSelector()
+        globex, research = Named('globex'), Named('research')
+        selector.add(globex, path_prefixes=['/globex/'])
+        selector.add(research, path_prefixes=['/globex/research'])
+        assert selector.select('localhost', '/globex') is globex
+        assert selector.select('localhost', '/globex/api/items') is globex
+        assert selector.select('localhost', '/globex/research/items/1') is research
+        assert selector.select('localhost', '/globexx/api') is None
+        assert selector.select('localhost', '/') is None
+
+    def test_host_first(self):
+        selector = TenantSelector()
+        acme, globex = Named('acme'), Named('globex')
+        selector.add(acme, hosts=['acme.example.com'])
+        selector.add(globex, path_prefixes=['/globex'])
+        assert selector.select('acme.example.com', '/globex/items') is acme
+
+    @pytest.mark.parametrize('second', [
+        {'hosts': ['acme.example.com']},
+        {'path_prefixes': ['acme']},
+    ])
+    def test_taken(self, second):
+        selector = TenantSelector()
+        selector.add(Named('acme'), hosts=['acme.example.com'], path_prefixes=['/acme'])
+        with pytest.raises(RuntimeError):
+            selector.add(Named('other'), **second)
+
+    def test_same_name(self):
+        selector = TenantSelector()
+        selector.add(Named('acme'))
+        with pytest.raises(RuntimeError):
+            selector.add(Named('acme'))
+
+
+class TestTenants:
+    """Test tenants of one app."""
+
+    def test_by_host(self, tenants):
+        testapp, _ = tenants
+        res = testapp.get('/whoami', headers=bearer('acme', 'acme-api'),
+                          extra_environ={'HTTP_HOST': 'acme.example.com'})
+        assert res.json['sub'] == 'acme'
+
+    def test_by_prefix(self, tenants):
+        testapp, _ = tenants
+        res = testapp.get('/globex/whoami', headers=bearer('globex', 'globex-api'))
+        assert res.json['sub'] == 'globex'
+
+    def test_default(self, tenants):
+        testapp, _ = tenants
+        res = testapp.get('/whoami', headers=bearer('default', 'default-api'))
+        assert res.json['sub'] == 'default'
+
+    @pytest.mark.parametrize('path, host, headers, code', [
+        ('/whoami', 'acme.example.com', bearer('globex', 'globex-api'), 'Invalid_header.'),
+        ('/whoami', 'acme.example.com', bearer('acme', 'globex-api'), 'invalid_claims'),
+        ('/globex/whoami', 'localhost', bearer('acme', 'acme-api'), 'Invalid_header.'),
+        ('/whoami', 'localhost', bearer('acme', 'acme-api'), 'Invalid_header.'),
+    ])
+    def test_isolated(self, tenants, path, host, headers, code):
+        testapp, _ = tenants
+        res = testapp.get(path, headers=headers, extra_environ={'HTTP_HOST': host},
+                          status=401)
+        assert res.json['code'] == code
+
+    def test_own_caches(self, tenants):
+        testapp, consumers = tenants
+        acme, globex = consumers['acme'].config, consumers['globex'].config
+        assert acme.verifier is not globex.verifier
+        assert acme.stats is not globex.stats
+        assert acme.decode_keys is acme.decode_keys
+        testapp.get('/globex/whoami', headers=bearer('globex', 'globex-api'))
+        assert globex.stats.lookups == 1
+        assert acme.stats.lookups == 0
+
+    def test_app_options_inherited(self, tenants):
+        _, consumers = tenants
+        acme = consumers['acme'].config
+        assert acme.header_type == 'Bearer'
+        assert acme.verify_aud is True
+
+    def test_stats_of_own_tenant(self):
+        app = Flask(__name__)
+        app.config['JWT_AUTHORIZED_KEYS'] = authorized('default')
+        app.config['JWT_STATS_ENDPOINT'] = '/stats'
+        app.config['JWT_REGISTER_ERROR_HANDLER'] = True
+        JWTConsumer(app)
+        JWTConsumer(app, name='acme', hosts=['acme.example.com'],
+                    settings={'JWT_AUTHORIZED_KEYS': authorized('acme') + ' acme-key',
+                              'JWT_STATS_ENDPOINT': '/stats'})
+        JWTConsumer(app, name='globex', hosts=['globex.example.com'],
+                    settings={'JWT_AUTHORIZED_KEYS': authorized('globex') + ' globex-key',
+                              'JWT_STATS_ENDPOINT': '/stats'})
+        JWTConsumer(app, name='initech', path_prefixes=['/stats'],
+                    settings={'JWT_AUTHORIZED_KEYS': authorized('acme')})
+        testapp = TestApp(app)
+
+        for name in ('acme', 'globex'):
+            headers = dict(bearer(name, None), Host=name + '.example.com')
+            keys = testapp.get('/stats', headers=headers).json['keys']
+            assert [key['comment'] for key in keys] == [name + '-key']
+        headers = dict(bearer('acme', None), Host='globex.example.com')
+        testapp.get('/stats', headers=headers, status=401)
+        # Default endpoint under the prefix of a tenant without one
+        testapp.get('/stats', headers=bearer('acme', None), status=404)
+
+    def test_settings_need_name(self):
+        with pytest.raises(RuntimeError):
+            JWTConsumer(settings={'JWT_IDENTITY': 'acme-api'})
+
+
+class TestMiddleware:
+    """Test tenants behind the WSGI middleware."""
+
+    @pytest.fixture
+    def behind_middleware(self):
+        app = Flask(__name__)
+        app.config['JWT_AUTHORIZED_KEYS'] = authorized('default')
+        app.config['JWT_REGISTER_ERROR_HANDLER'] = True
+        default = JWTConsumer(app)
+        acme = JWTConsumer(app, name='acme', path_prefixes=['/acme'],
+                           settings={'JWT_AUTHORIZED_KEYS': authorized('acme')})
+        JWTConsumer(app, name='globex', hosts=['globex.example.com'],
+                    settings={'JWT_AUTHORIZED_KEYS': authorized('globex')})
+
+        @app.route('/x')
+        @app.route('/acme/x')
+        @requires_jwt
+        def x():
+            return jsonify(get_jwt_payload())
+
+        @app.route('/acme/open')
+        def open_view():
+            return jsonify(get_jwt_payload())
+
+        return app, default, acme
+
+    def test_app_token_rejected_for_tenant(self, behind_middleware):
+        app, _, acme = behind_middleware
+        app.wsgi_app = JWTMiddleware(app.wsgi_app, app.config)
+        testapp = TestApp(app)
+        testapp.get('/acme/x', headers=bearer('default', None), status=401)
+        assert acme.config.stats.failures['Invalid_header.'] == 1
+        assert testapp.get('/acme/open', headers=bearer('default', None)).json == {}
+
+    def test_app_token_verified_once(self, behind_middleware):
+        app, default, _ = behind_middleware
+        middleware = app.wsgi_app = JWTMiddleware(app.wsgi_app, app.config)
+        lookups = default.config.stats.lookups
+        response = TestApp(app).get('/x', headers=bearer('default', None))
+        assert response.json['sub'] == 'default'
+        assert middleware.config.stats.lookups == 1
+        assert default.config.stats.lookups == lookups
+
+    def test_tenant_exempt(self, behind_middleware):
+        app, _, _ = behind_middleware
+        app.wsgi_app = JWTMiddleware(app.wsgi_app, app.config, exempt=['/acme'])
+        testapp = TestApp(app)
+        assert testapp.get('/acme/x', headers=bearer('acme', None)).json['sub'] == 'acme'
+        testapp.get('/acme/x', headers=bearer('default', None), status=401)
+
+    def test_tenants_left_to_requires_jwt(self, behind_middleware):
+        app, _, _ = behind_middleware
+        middleware = app.wsgi_app = JWTMiddleware(app.wsgi_app, app.config,
+                                                  tenants=selector_of(app))
+        testapp = TestApp(app)
+        globex = {'Host': 'globex.example.com'}
+        assert testapp.get('/acme/x', headers=bearer('acme', None)).json['sub'] == 'acme'
+        assert testapp.get('/x', headers=dict(bearer('globex', None), **globex)).json['sub'] == 'globex'
+        testapp.get('/acme/x', headers=bearer('default', None), status=401)
+        testapp.get('/x', headers=dict(bearer('default', None), **globex), status=401)
+        assert middleware.config.stats.lookups == 0
+        # Requests no tenant claims are still verified by the middleware
+        testapp.get('/x', headers=bearer('acme', None), status=401)
+        assert middleware.config.stats.failures['Invalid_header.'] == 1
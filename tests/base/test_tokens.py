@@ -0,0 +1,71 @@
+"""Testing token parsing and extraction limits."""
+from unittest import mock
+
+import pytest
+from jwt.utils import base64url_encode
+
+from flask_jwt_consumer import AuthError, get_jwt_raw
+from flask_jwt_consumer import errors
+from flask_jwt_consumer.tokens import _parse_header, parse_token
+
+HEADER = base64url_encode(b'{"alg":"RS256","kid":"one"}').decode('utf-8')
+
+
+class TestTokens:
+    """Test token parsing."""
+
+    def test_header_is_memoized(self):
+        _parse_header.cache_clear()
+        first = parse_token(HEADER + '.e30.c2ln')
+        second = parse_token(HEADER + '.eyJhIjoxfQ.c2lnbg')
+        assert first.header == {'alg': 'RS256', 'kid': 'one'}
+        assert first.header is second.header
+        assert _parse_header.cache_info().hits == 1
+
+    def test_bad_header_is_memoized_too(self):
+        _parse_header.cache_clear()
+        assert parse_token('bm9wZQ.e30.c2ln') is None
+        assert parse_token('bm9wZQ.e30.c2ln') is None
+        assert _parse_header.cache_info().hits == 1
+
+    def test_token_too_long(self, live_testapp):
+        token = '.'.join([HEADER, 'a' * 9000, 'c2ln'])
+        with mock.patch('flask.request.headers.get',
+                        return_value='Bearer ' + token):
+            with pytest.raises(AuthError) as error:
+                get_jwt_raw()
+
+            assert error.value.content == errors.TOKEN_TOO_LONG
+
+    def test_token_too_many_segments(self, live_testapp):
+        with mock.patch('flask.request.headers.get',
+                        return_value='Bearer a.b.c.d.e'):
+            with pytest.raises(AuthError) as error:
+                get_jwt_raw()
+
+            assert error.value.content == errors.TOKEN_TOO_MANY_SEGMENTS
+
+    def test_limits_are_configurable(self, live_testapp, live_app):
+        live_app.config['JWT_MAX_TOKEN_LENGTH'] = None
+        live_app.config['JWT_MAX_TOKEN_SEGMENTS'] = 5
+        token = '.'.join(['a' * 9000, 'b', 'c', 'd', 'e'])
+        with mock.patch('flask.request.headers.get',
+                        return_value='Bearer ' + token):
+            assert get_jwt_raw() == token
+
+    def test_cookie_token_too_long(self, live_testapp, live_app):
+        live_app.config['JWT_USE_COOKIE'] = True
+        live_app.config['JWT_COOKIE_NAME'] = 'jwt'
+        with mock.patch('flask.request.cookies.get', return_value='a' * 9000):
+            with pytest.raises(AuthError) as error:
+                get_jwt_raw()
+
+            assert error.value.content == errors.TOKEN_TOO_LONG
+
+    def test_blank_header(self, live_testapp):
+        with mock.patch('flask.request.headers.get', return_value='   '):
+            with pytest.raises(AuthError) as error:
+                get_jwt_raw()
+
+            assert error.value.content == {'code': 'invalid_header',
+                                           'description': 'Authorization header must start with Bearer.'}